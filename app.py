@@ -1,20 +1,75 @@
 import os
 import json
-import io
-import base64
+import hmac
+import click
 from urllib.parse import urlencode
-from flask import Flask, render_template, request, redirect, url_for, Response, jsonify, session
-from werkzeug.utils import secure_filename
+from datetime import date
+from flask import (
+    Flask, render_template, request, redirect, url_for, Response, jsonify, session, g, abort, stream_with_context,
+)
+from flask.cli import AppGroup
+from werkzeug.local import LocalProxy
 from config import Config
-from models import db, User, Card, CardView
+from models import db, User, Card, BackgroundImage
 import uuid
-import qrcode
-from auth_ulties import app_page_login_required, get_user_id
-from He5Lib.he5IAMConnect import load_iam_data, get_session_token_from_auth_token
-from utils.db_utils import get_db
+from auth_ulties import (
+    app_page_login_required, app_api_login_required, public_route, is_public_request, ensure_iam_context,
+    get_user_id, get_current_db_user,
+)
+from He5Lib.he5IAMConnect import get_session_token_from_auth_token
+from utils import db_routing
+from utils.db_routing import read_replica
+from utils.request_metrics import PROMETHEUS_MIMETYPE, request_metrics
 from utils.permissions import has_permission, ROLE_VIEWER
-
-app = Flask(__name__)
+from utils.view_recorder import view_recorder
+from utils.migrations import run_migrations
+from utils.qr_codes import render_qr, QR_MIMETYPES
+from utils.bg_images import store_background_image, release_background_image
+from utils.images import (
+    IMAGE_KINDS, InvalidImageError, normalize_upload, prepare_print_background, variant_filename,
+)
+from utils.upload_store import UploadStore, is_content_addressed
+from utils.card_listing import list_user_cards, InvalidCursorError
+from utils.page_cache import page_cache
+from utils.print_renderer import RENDER_FORMATS, RenderCache, build_render_spec
+from utils.print_sheets import SHEET_LAYOUTS, SHEET_SIZES, iter_sheet_pdf
+from utils.print_layout import (
+    LAYOUT_PATCH_MIMETYPE, MAX_LAYOUT_BYTES, InvalidLayoutError,
+    layout_etag, layout_json, merge_patch, normalize_layout, parse_layout_json,
+)
+from utils.card_import import IMPORT_FORMATS, import_cards, iter_csv_rows, iter_jsonl_rows, open_text
+from utils.view_analytics import card_trend, compact_views, delete_card_views, top_cards
+from utils.card_export import EXPORT_FORMATS, export_cards
+from utils.vcard import (
+    VCARD_VERSIONS, build_vcard, downscale_photo, vcard_cache, vcard_content_disposition, vcard_etag,
+)
+
+
+def _uploaded_file(filename):
+    """Path relative to static/uploads for a static filename, or None."""
+    filename = (filename or '').replace('\\', '/')
+    return filename[len('uploads/'):] if filename.startswith('uploads/') else None
+
+
+class CardMakerFlask(Flask):
+    def get_send_file_max_age(self, filename):
+        # Uploaded card images get a real max-age; static send_file already
+        # provides ETag/Last-Modified, 304s and Range support.
+        uploaded = _uploaded_file(filename)
+        if uploaded is not None:
+            if is_content_addressed(uploaded):
+                return IMMUTABLE_MAX_AGE
+            return self.config.get('UPLOAD_MAX_AGE')
+        return super().get_send_file_max_age(filename)
+
+    def send_static_file(self, filename):
+        response = super().send_static_file(filename)
+        if is_content_addressed(_uploaded_file(filename)):
+            response.cache_control.immutable = True
+        return response
+
+
+app = CardMakerFlask(__name__)
 app.config.from_object(Config)
 
 
@@ -27,50 +82,98 @@ if not app.config.get("IAM_AUTH_HEAD_KEY"):
 
 @app.before_request
 def load_iam_context():
-    load_iam_data()
+    # Public card pages and static assets resolve identity lazily, only when
+    # something asks for the current user (see auth_ulties.public_route).
+    if is_public_request():
+        return
+    ensure_iam_context()
 
 # Upload folder config
 UPLOAD_FOLDER = os.path.join(app.root_path, 'static', 'uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+QR_MAX_AGE = 30 * 24 * 3600
+# Content-addressed uploads never change once written
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# get_bg_image URLs carrying the image hash (?v=...) never change content
+BG_IMAGE_VERSIONED_MAX_AGE = IMMUTABLE_MAX_AGE
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+upload_store = UploadStore(UPLOAD_FOLDER)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_upload(file, prefix):
-    """Save an uploaded file with a unique prefix and return the filename, or None."""
+def save_upload(file, kind):
+    """
+    Normalize an uploaded picture (see utils/images.py) and put it in the
+    content-addressed upload store. Returns the stored filename, or None
+    when no file with an allowed extension was sent.
+    The caller owns the new reference and must release the one it replaces.
+
+    Raises:
+        InvalidImageError: if the file is not a usable image
+    """
     if file and file.filename and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filename = f"{prefix}_{filename}"
-        file.save(os.path.join(UPLOAD_FOLDER, filename))
-        return filename
+        data, ext = normalize_upload(file.read(), kind)
+        return upload_store.store(data, ext, kind)
     return None
 
-def generate_qr_base64(data):
-    """Generate QR code and return as base64 string."""
-    qr = qrcode.QRCode(version=1, box_size=10, border=2)
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    return base64.b64encode(buffer.getvalue()).decode()
+
+@app.template_global()
+def upload_srcset(filename, kind):
+    """srcset for an uploaded picture, listing the WebP variants built so far."""
+    if not filename:
+        return ''
+    entries = []
+    for width in IMAGE_KINDS[kind]['widths']:
+        name = variant_filename(filename, width)
+        if os.path.exists(os.path.join(UPLOAD_FOLDER, name)):
+            entries.append(f"{url_for('static', filename='uploads/' + name)} {width}w")
+    return ', '.join(entries)
+
+def background_image_url(card):
+    """Versioned get_bg_image URL for the card's uploaded background, or ''."""
+    if card.print_bg_image_id is None:
+        return ''
+    image = db.session.get(BackgroundImage, card.print_bg_image_id)
+    if image is None:
+        return ''
+    return url_for('get_bg_image', card_id=card.id, v=image.sha256[:16])
+
+def vcard_photo(card):
+    """Downscaled JPEG of the card's profile picture for the vCard, or None."""
+    if not card.profile_pic:
+        return None
+    try:
+        with open(upload_store.path_for(card.profile_pic), 'rb') as fh:
+            return downscale_photo(fh.read())
+    except OSError:
+        return None
 
 # Initialize DB
 db.init_app(app)
-
-# Create DB
-with app.app_context():
-    db.create_all()
+db_routing.init_app(app)
+request_metrics.init_app(app)
+view_recorder.init_app(app)
+page_cache.init_app(app)
+print_cache = RenderCache(
+    app.config.get("PRINT_CACHE_DIR") or os.path.join(app.instance_path, "print_cache"),
+    max_bytes=app.config["PRINT_CACHE_MAX_MB"] * 1024 * 1024,
+    max_age=app.config["PRINT_CACHE_MAX_AGE_DAYS"] * 24 * 3600,
+)
+
+# Create DB. Print-sheet workers (utils/print_sheets.py) are spawned
+# processes that re-import this file as __mp_main__ when the app is run
+# with ``python app.py``; they only render, so they skip the schema work.
+if __name__ != "__mp_main__":
+    with app.app_context():
+        db.create_all()
+        run_migrations()
 
 
 
 def get_current_app_user():
-    user_id = get_user_id()
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    """Return the logged-in User; the lookup is cached on g for the request."""
+    return get_current_db_user()
 
 
 class TemplateUserProxy:
@@ -84,12 +187,16 @@ class TemplateUserProxy:
 
 
 def build_template_current_user():
+    if 'template_current_user' in g:
+        return g.template_current_user
+
     user = get_current_app_user()
     if not user:
-        return TemplateUserProxy(False)
+        g.template_current_user = TemplateUserProxy(False)
+        return g.template_current_user
 
     display_name = (user.name or user.email or "User").strip() or "User"
-    return TemplateUserProxy(
+    g.template_current_user = TemplateUserProxy(
         True,
         user_id=user.id,
         name=display_name,
@@ -97,11 +204,14 @@ def build_template_current_user():
         profile_pic=user.profile_pic or "",
         role=getattr(user, "role", ROLE_VIEWER) or ROLE_VIEWER,
     )
+    return g.template_current_user
 
 
 @app.context_processor
 def inject_current_user():
-    return {"current_user": build_template_current_user()}
+    # Resolved on first attribute access, so templates that never touch
+    # current_user never trigger an identity lookup.
+    return {"current_user": LocalProxy(build_template_current_user)}
 
 
 def current_user_role():
@@ -183,6 +293,23 @@ TEMPLATE_PRESETS = {
     }
 }
 
+
+def preset_layout(template_name):
+    """Full print layout for a TEMPLATE_PRESETS entry, as stored in print_layout_json."""
+    template_config = TEMPLATE_PRESETS[template_name]
+    return {
+        'positions': template_config['positions'],
+        'background': template_config['background'],
+        'accent': template_config['accent'],
+        'preset': template_config['preset'],
+        'bg_template_filename': template_config.get('bg_template_filename'),
+        'show_phone': True,
+        'show_email': True,
+        'show_website': True,
+        'show_address': False,
+        'custom_text': ''
+    }
+
 # ───────── ROUTES ─────────
 
 @app.route("/")
@@ -229,10 +356,123 @@ def logout():
 
 @app.route("/dashboard")
 @app_page_login_required
+@read_replica
 def dashboard():
-    user = get_current_app_user()
-    user_cards = Card.query.filter_by(user_id=user.id).order_by(Card.created_at.desc()).all() if user else []
-    return render_template("dashboard.html", user_cards=user_cards)
+    user_id = get_user_id()
+    user_cards, next_cursor = [], None
+    if user_id:
+        try:
+            user_cards, next_cursor = list_user_cards(
+                user_id, request.args.get("cursor"), app.config["DASHBOARD_PAGE_SIZE"]
+            )
+        except InvalidCursorError:
+            return redirect(url_for("dashboard"))
+    return render_template("dashboard.html", user_cards=user_cards, next_cursor=next_cursor)
+
+@app.route("/dashboard/cards")
+@app_api_login_required
+@read_replica
+def dashboard_cards():
+    """JSON page of the dashboard listing (infinite scroll)."""
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({'cards': [], 'next_cursor': None})
+    try:
+        rows, next_cursor = list_user_cards(
+            user_id,
+            request.args.get("cursor"),
+            request.args.get("limit", app.config["DASHBOARD_PAGE_SIZE"], type=int),
+        )
+    except InvalidCursorError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    cards = [
+        {
+            'id': row.id,
+            'name': row.name,
+            'designation': row.designation or row.title,
+            'views': row.views or 0,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'view_url': url_for('view_card', card_id=row.id),
+            'edit_url': url_for('edit_card', card_id=row.id),
+            'templates_url': url_for('card_templates', card_id=row.id),
+        }
+        for row in rows
+    ]
+    return jsonify({'cards': cards, 'next_cursor': next_cursor})
+
+@app.route("/cards/export")
+@app_api_login_required
+def export_cards_download():
+    """
+    Stream every card visible to the caller as ?format=vcf|csv|jsonl|zip.
+
+    Admins and organizers export all cards, everyone else their own.
+    ?photos=1 embeds profile photos in the vCards.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Invalid format. Use vcf, csv, jsonl or zip'}), 400
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    owner_id = None if has_permission(current_user_role(), "cards.export") else user_id
+    chunks = export_cards(
+        fmt,
+        lambda card_id: url_for("view_card", card_id=card_id, _external=True),
+        user_id=owner_id,
+        photo_for=vcard_photo if request.args.get('photos') == '1' else None,
+    )
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="cards-{date.today().isoformat()}.{fmt}"'
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
+def run_card_import(stream, fmt, user_id, template_name=None, dry_run=False):
+    """Import cards from a text ``stream`` for ``user_id`` (see utils/card_import.py)."""
+    rows = iter_csv_rows(stream) if fmt == 'csv' else iter_jsonl_rows(stream)
+    layout = preset_layout(template_name) if template_name else None
+    return import_cards(
+        rows,
+        user_id,
+        layout=layout,
+        bg_template=layout['bg_template_filename'] if layout else None,
+        dry_run=dry_run,
+    )
+
+@app.route("/cards/import", methods=["POST"])
+@app_api_login_required
+def import_cards_upload():
+    """
+    Create cards in bulk from an uploaded CSV or JSONL file ("file" field).
+
+    Optional form fields / query args: format (csv|jsonl, default from the
+    file extension), template (a TEMPLATE_PRESETS name applied to every
+    card) and dry_run=1 (validate only).
+    """
+    user_id = get_user_id()
+    if not user_id or not has_permission(current_user_role(), "cards.create"):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'error': 'No file uploaded'}), 400
+    fmt = (request.values.get('format') or upload.filename.rsplit('.', 1)[-1]).lower()
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': 'Invalid format. Use csv or jsonl'}), 400
+
+    template_name = request.values.get('template')
+    if template_name and template_name not in TEMPLATE_PRESETS:
+        return jsonify({'error': 'Invalid template'}), 400
+
+    result = run_card_import(open_text(upload.stream), fmt, user_id, template_name,
+                             dry_run=request.values.get('dry_run') == '1')
+    status = 200 if result.created or not result.failed else 400
+    return jsonify({'created': result.created, 'failed': result.failed, 'errors': result.errors}), status
 
 @app.route("/form")
 @app_page_login_required
@@ -299,61 +539,59 @@ def save_card():
     card.youtube = request.form.get("youtube")
     card.whatsapp = request.form.get("whatsapp")
 
-    profile_file = request.files.get("profile_pic")
-    if profile_file and profile_file.filename:
-        uploaded = save_upload(profile_file, f"profile_{card.id or 'new'}")
-        if uploaded:
-            card.profile_pic = uploaded
-
-    banner_file = request.files.get("banner_pic")
-    if banner_file and banner_file.filename:
-        uploaded = save_upload(banner_file, f"banner_{card.id or 'new'}")
-        if uploaded:
-            card.banner_pic = uploaded
+    try:
+        profile_upload = save_upload(request.files.get("profile_pic"), 'profile')
+        banner_upload = save_upload(request.files.get("banner_pic"), 'banner')
+    except InvalidImageError:
+        # Nothing is saved, so the card never ends up without the picture
+        # the user thinks they uploaded.
+        db.session.rollback()
+        return jsonify({'error': 'Invalid image file'}), 400
+    if profile_upload:
+        upload_store.release(card.profile_pic)
+        card.profile_pic = profile_upload
+    if banner_upload:
+        upload_store.release(card.banner_pic)
+        card.banner_pic = banner_upload
 
     db.session.commit()
 
     return redirect(url_for("view_card", card_id=card.id))
 
 @app.route("/card/<int:card_id>")
+@public_route
+@read_replica
 def view_card(card_id):
-    card = Card.query.get_or_404(card_id)
+    # Only the owner id and version are needed to count the view and to
+    # serve a cached render; the full row is loaded on a cache miss.
+    meta = db.session.query(Card.user_id, Card.version).filter_by(id=card_id).first()
+    if meta is None:
+        abort(404)
     viewer = get_current_app_user()
 
     if "anon_id" not in session:
         session["anon_id"] = str(uuid.uuid4())
 
+    # Views are buffered and written in batches; see utils/view_recorder.py
     if viewer:
-        if viewer.id != card.user_id:
-            existing_view = CardView.query.filter_by(
-                card_id=card.id,
-                viewer_id=viewer.id
-            ).first()
-
-            if not existing_view:
-                new_view = CardView(
-                    card_id=card.id,
-                    viewer_id=viewer.id
-                )
-                db.session.add(new_view)
-                card.views += 1
-                db.session.commit()
+        if viewer.id != meta.user_id:
+            view_recorder.record(card_id, viewer_id=viewer.id)
     else:
-        existing_view = CardView.query.filter_by(
-            card_id=card.id,
-            session_id=session["anon_id"]
-        ).first()
-
-        if not existing_view:
-            new_view = CardView(
-                card_id=card.id,
-                session_id=session["anon_id"]
-            )
-            db.session.add(new_view)
-            card.views += 1
-            db.session.commit()
+        view_recorder.record(card_id, session_id=session["anon_id"])
 
-    return render_template("card.html", card=card)
+    # The owner sees edit controls and the view count, so only other
+    # visitors share the cached page.
+    is_owner = bool(viewer and viewer.id == meta.user_id)
+    if not is_owner:
+        html = page_cache.get(card_id, meta.version)
+        if html is not None:
+            return html
+
+    card = Card.query.get_or_404(card_id)
+    html = render_template("card.html", card=card)
+    if not is_owner:
+        page_cache.set(card.id, card.version, html)
+    return html
 
 # ───────── TEMPLATE SELECTION ROUTE (NEW) ─────────
 
@@ -392,26 +630,13 @@ def select_template(card_id):
     if template_name not in TEMPLATE_PRESETS:
         return jsonify({'error': 'Invalid template'}), 400
     
-    # Apply template preset to card
-    template_config = TEMPLATE_PRESETS[template_name]
-
     # Persist the template background filename directly on the card model
     # so it can be retrieved without parsing the layout JSON.
-    card.print_bg_template = template_config.get('bg_template_filename')
+    layout = preset_layout(template_name)
+    card.print_bg_template = layout['bg_template_filename']
 
     # Store full layout in print_layout_json (single source of truth for the designer)
-    card.print_layout_json = json.dumps({
-        'positions': template_config['positions'],
-        'background': template_config['background'],
-        'accent': template_config['accent'],
-        'preset': template_config['preset'],
-        'bg_template_filename': template_config.get('bg_template_filename'),
-        'show_phone': True,
-        'show_email': True,
-        'show_website': True,
-        'show_address': False,
-        'custom_text': ''
-    })
+    card.print_layout_json = layout_json(layout)
     
     db.session.commit()
     
@@ -427,12 +652,7 @@ def card_designer(card_id):
         return redirect(url_for("dashboard"))
     
     # Parse layout JSON in Python — never in templates
-    layout = {}
-    if card.print_layout_json:
-        try:
-            layout = json.loads(card.print_layout_json)
-        except (ValueError, TypeError):
-            layout = {}
+    layout = load_print_layout(card)
 
     positions    = layout.get('positions', {})
     sizes        = layout.get('sizes', {})
@@ -446,10 +666,11 @@ def card_designer(card_id):
     font_colors  = layout.get('font_colors', {})
 
     # Background image priority:
-    # 1. User-uploaded binary image (card.print_bg_image) — served via /get_bg_image
+    # 1. User-uploaded image (card.print_bg_image_id) — served via /get_bg_image
     # 2. Template default static image (card.print_bg_template filename)
     # 3. Fallback to background colour class
-    has_user_bg = bool(card.print_bg_image)
+    has_user_bg = card.print_bg_image_id is not None
+    bg_image_url = background_image_url(card)
 
     bg_template_filename = card.print_bg_template or layout.get('bg_template_filename') or ''
     template_bg_url = (
@@ -457,13 +678,12 @@ def card_designer(card_id):
         if bg_template_filename else ''
     )
 
-    # Generate QR code for designer preview
-    card_url = url_for("view_card", card_id=card.id, _external=True)
-    qr_base64 = generate_qr_base64(card_url)
+    # QR preview is served (and browser-cached) by card_qr
+    qr_url = url_for("card_qr", card_id=card.id, format="svg")
 
     return render_template("designer.html",
         card=card,
-        qr_base64=qr_base64,
+        qr_url=qr_url,
         positions=positions,
         sizes=sizes,
         saved_bg=saved_bg,
@@ -474,31 +694,149 @@ def card_designer(card_id):
         show_website=show_website,
         show_address=show_address,
         has_user_bg=has_user_bg,
+        bg_image_url=bg_image_url,
         template_bg_url=template_bg_url,
         font_colors=font_colors,
+        saved_layout=layout,
+        layout_version=card.print_layout_version or 0,
     )
 
 @app.route("/card/<int:card_id>/save_layout", methods=["POST"])
 @app_page_login_required
 def save_layout(card_id):
-    card = Card.query.get_or_404(card_id)
-    if not card_action_allowed(card, "cards.design"):
+    """
+    Save the designer layout, either whole (application/json) or as a JSON
+    merge patch (application/merge-patch+json) on top of the stored layout.
+
+    Patches must name the version they were made against in If-Match
+    (the ETag returned by the previous save); full saves may. A stale
+    version gets a 412 with the current version.
+    """
+    meta = db.session.query(
+        Card.user_id, Card.print_layout_json, Card.print_layout_version
+    ).filter_by(id=card_id).first()
+    if meta is None:
+        abort(404)
+    if not card_action_allowed(meta, "cards.design"):
         return jsonify({'error': 'Unauthorized'}), 403
 
-    layout_data = request.get_json()
-    if not layout_data:
+    # Layouts are a few hundred bytes; refuse anything larger before parsing.
+    if request.content_length is not None and request.content_length > MAX_LAYOUT_BYTES:
+        return jsonify({'error': 'Layout too large'}), 413
+    request.max_content_length = MAX_LAYOUT_BYTES
+
+    base_version = meta.print_layout_version or 0
+    is_patch = request.mimetype == LAYOUT_PATCH_MIMETYPE
+    if request.if_match:
+        if not request.if_match.contains(layout_etag(base_version)):
+            return layout_saved_response(base_version, 'Layout was changed elsewhere', 412)
+    elif is_patch:
+        return jsonify({'error': 'If-Match is required for patches'}), 428
+
+    layout_data = request.get_json(silent=True)
+    if not layout_data or not isinstance(layout_data, dict):
         return jsonify({'error': 'No data'}), 400
+    changes = layout_data
+    if is_patch:
+        layout_data = merge_patch(parse_layout_json(meta.print_layout_json), changes)
+    try:
+        layout_data = normalize_layout(layout_data)
+    except InvalidLayoutError as exc:
+        return jsonify({'error': f'Invalid layout: {exc}'}), 400
+
+    # Store everything in print_layout_json — single source of truth,
+    # in canonical compact form (utils/print_layout.py)
+    stored = layout_json(layout_data)
+    if stored == meta.print_layout_json:
+        return layout_saved_response(base_version)
+    values = {'print_layout_json': stored, 'print_layout_version': base_version + 1}
 
     # If the designer sends a bg_template_filename, mirror it onto the model field
-    # so print_card can read it without re-parsing the JSON every time.
-    if 'bg_template_filename' in layout_data:
-        card.print_bg_template = layout_data['bg_template_filename'] or None
-
-    # Store everything in print_layout_json — single source of truth
-    card.print_layout_json = json.dumps(layout_data)
+    # so print_card can read it without re-parsing the JSON every time. A patch
+    # removing the key leaves the card's template background alone.
+    bg_template_filename = layout_data.get('bg_template_filename')
+    if 'bg_template_filename' in changes and isinstance(bg_template_filename, str) and bg_template_filename:
+        values['print_bg_template'] = bg_template_filename
+
+    # Compare-and-set on the version, so a concurrent save cannot be lost.
+    result = db.session.execute(
+        db.update(Card)
+        .where(Card.id == card_id, Card.print_layout_version == base_version)
+        .values(**values)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        current = db.session.query(Card.print_layout_version).filter_by(id=card_id).scalar()
+        return layout_saved_response(current, 'Layout was changed elsewhere', 412)
     db.session.commit()
+    return layout_saved_response(base_version + 1)
+
+def layout_saved_response(version, error=None, status=200):
+    """JSON save result carrying the layout version and its ETag."""
+    body = {'success': True} if error is None else {'error': error}
+    body['version'] = version or 0
+    response = jsonify(body)
+    response.status_code = status
+    response.set_etag(layout_etag(version))
+    return response
+
+def load_print_layout(card):
+    """Parsed print_layout_json, or {} when missing or malformed."""
+    return parse_layout_json(card.print_layout_json)
+
+
+def card_render_spec(card):
+    """Render spec for the server-side print renderer (same inputs as print_card)."""
+    layout = load_print_layout(card)
+    # Only the hash: the blob is loaded by load_background_data on a cache miss.
+    background_image = None
+    if card.print_bg_image_id is not None:
+        background_image = db.session.query(BackgroundImage.sha256).filter_by(id=card.print_bg_image_id).scalar()
 
-    return jsonify({'success': True})
+    bg_template_filename = card.print_bg_template or layout.get('bg_template_filename')
+    if not bg_template_filename and layout.get('preset') in TEMPLATE_PRESETS:
+        bg_template_filename = TEMPLATE_PRESETS[layout['preset']].get('bg_template_filename')
+    template_background = None
+    if bg_template_filename:
+        template_background = os.path.join(app.static_folder, 'templates', 'bg', os.path.basename(bg_template_filename))
+
+    return build_render_spec(
+        card,
+        layout,
+        url_for("view_card", card_id=card.id, _external=True),
+        background_image=background_image,
+        template_background=template_background,
+    )
+
+def load_background_data(sha256):
+    """Bytes of an uploaded print background, for renders that miss the cache."""
+    return db.session.query(BackgroundImage.data).filter_by(sha256=sha256).scalar()
+
+def iter_card_render_specs(card_ids, batch_size=50):
+    """Render specs for ``card_ids`` in order, loading the cards in small batches."""
+    for start in range(0, len(card_ids), batch_size):
+        batch = card_ids[start:start + batch_size]
+        cards = {card.id: card for card in Card.query.filter(Card.id.in_(batch))}
+        for card_id in batch:
+            if card_id in cards:
+                yield card_render_spec(cards[card_id])
+
+
+def print_sheet_response(card_ids, sheet, per_sheet, crop_marks=True):
+    """Stream an N-up PDF of ``card_ids``; pages go out as they are rendered."""
+    pages = iter_sheet_pdf(
+        iter_card_render_specs(card_ids),
+        sheet=sheet,
+        per_sheet=per_sheet,
+        crop_marks=crop_marks,
+        cache=print_cache,
+        load_background=load_background_data,
+    )
+    response = Response(stream_with_context(pages), mimetype="application/pdf")
+    response.headers["Content-Disposition"] = f'attachment; filename="cards-{sheet}-{per_sheet}up.pdf"'
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
 
 @app.route("/card/<int:card_id>/print")
 @app_page_login_required
@@ -508,15 +846,11 @@ def print_card(card_id):
         return redirect(url_for("dashboard"))
 
     # Determine whether a user-uploaded background image exists
-    has_bg_image = card.print_bg_image is not None
+    has_bg_image = card.print_bg_image_id is not None
+    bg_image_url = background_image_url(card)
 
     # Parse layout JSON in Python — never in templates
-    layout = {}
-    if card.print_layout_json:
-        try:
-            layout = json.loads(card.print_layout_json)
-        except (ValueError, TypeError):
-            layout = {}
+    layout = load_print_layout(card)
 
     positions    = layout.get('positions', {})
     sizes        = layout.get('sizes', {})
@@ -533,15 +867,15 @@ def print_card(card_id):
     # prefer the value stored on the card model; fall back to what's in layout JSON.
     bg_template_filename = card.print_bg_template or layout.get('bg_template_filename')
 
-    # Generate QR code
-    card_url = url_for("view_card", card_id=card.id, _external=True)
-    qr_base64 = generate_qr_base64(card_url)
+    # Vector QR so the printed code stays sharp at any DPI
+    qr_url = url_for("card_qr", card_id=card.id, format="svg")
 
     return render_template("print_card.html",
         card=card,
         has_bg_image=has_bg_image,
+        bg_image_url=bg_image_url,
         bg_template_filename=bg_template_filename,
-        qr_base64=qr_base64,
+        qr_url=qr_url,
         positions=positions,
         sizes=sizes,
         bg=bg,
@@ -554,13 +888,127 @@ def print_card(card_id):
         font_colors=font_colors,
     )
 
+@app.route("/card/<int:card_id>/print/render")
+@app_page_login_required
+def print_render(card_id):
+    """Print-resolution rendering of the card as ?format=png (default) or pdf."""
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in RENDER_FORMATS:
+        return jsonify({'error': 'Invalid format. Use png or pdf'}), 400
+    card = Card.query.get_or_404(card_id)
+    if not card_action_allowed(card, "cards.print"):
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    body, key = print_cache.get_or_render(card_render_spec(card), fmt, load_background_data)
+    response = Response(body, mimetype=RENDER_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'inline; filename="card-{card.id}.{fmt}"'
+    response.set_etag(key)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/print/sheets", methods=["POST"])
+@app_api_login_required
+def print_sheets():
+    """
+    N-up print sheet PDF for a batch of cards.
+
+    JSON body: {"card_ids": [...]} or {"user_id": N}, plus optional
+    "sheet" (a4|letter), "per_sheet" (8|10) and "crop_marks" (bool).
+    """
+    data = request.get_json(silent=True) or {}
+    sheet = str(data.get('sheet', 'a4')).lower()
+    if sheet not in SHEET_SIZES:
+        return jsonify({'error': 'Invalid sheet. Use a4 or letter'}), 400
+    try:
+        per_sheet = int(data.get('per_sheet', 10))
+    except (TypeError, ValueError):
+        per_sheet = None
+    if per_sheet not in SHEET_LAYOUTS:
+        return jsonify({'error': 'Invalid per_sheet. Use 8 or 10'}), 400
+
+    query = db.session.query(Card.id, Card.user_id)
+    if 'card_ids' in data:
+        try:
+            requested = [int(card_id) for card_id in data['card_ids']]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'card_ids must be a list of integers'}), 400
+        rows = {row.id: row for row in query.filter(Card.id.in_(requested))}
+        candidates = [rows[card_id] for card_id in dict.fromkeys(requested) if card_id in rows]
+    elif 'user_id' in data:
+        candidates = query.filter(Card.user_id == data['user_id']).order_by(Card.id).all()
+    else:
+        return jsonify({'error': 'Provide card_ids or user_id'}), 400
+
+    card_ids = [row.id for row in candidates if card_action_allowed(row, "cards.print")]
+    if not card_ids:
+        return jsonify({'error': 'No printable cards'}), 404
+    return print_sheet_response(card_ids, sheet, per_sheet, bool(data.get('crop_marks', True)))
+
+@app.route("/card/<int:card_id>/qr")
+@public_route
+def card_qr(card_id):
+    """Serve the card's QR code as PNG (default) or SVG (?format=svg)."""
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in QR_MIMETYPES:
+        return jsonify({'error': 'Invalid format. Use png or svg'}), 400
+
+    if not db.session.query(Card.id).filter_by(id=card_id).first():
+        return jsonify({'error': 'Card not found'}), 404
+
+    card_url = url_for("view_card", card_id=card_id, _external=True)
+    body, etag = render_qr(card_url, fmt=fmt)
+    return qr_response(request, body, etag, fmt)
+
+def qr_response(req, body, etag, fmt):
+    """Cacheable QR image response, conditional on ``req`` (also used by asgi.py)."""
+    response = Response(body, mimetype=QR_MIMETYPES[fmt])
+    response.set_etag(etag)
+    # The encoded URL only depends on the card id, so the image is stable.
+    response.cache_control.public = True
+    response.cache_control.max_age = QR_MAX_AGE
+    return response.make_conditional(req)
+
+@app.route("/card/<int:card_id>/analytics")
+@app_api_login_required
+def card_analytics(card_id):
+    """View trend of a card: ?days=30&granularity=day|hour."""
+    meta = db.session.query(Card.id, Card.user_id).filter_by(id=card_id).first()
+    if meta is None:
+        return jsonify({'error': 'Card not found'}), 404
+    if not card_action_allowed(meta, "cards.edit"):
+        return jsonify({'error': 'Unauthorized'}), 403
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('day', 'hour'):
+        return jsonify({'error': 'Invalid granularity. Use day or hour'}), 400
+    days = request.args.get('days', 30, type=int)
+    return jsonify(card_trend(card_id, days=days, granularity=granularity))
+
+@app.route("/analytics/top")
+@app_api_login_required
+def analytics_top_cards():
+    """Most viewed cards over ?days=7 (own cards, or all for admins/organizers)."""
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    owner_id = None if has_permission(current_user_role(), "analytics.view_all") else user_id
+    days = request.args.get('days', 7, type=int)
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    return jsonify({'days': days, 'cards': top_cards(owner_id, days=days, limit=limit)})
+
 @app.route("/card/<int:card_id>/delete", methods=["POST"])
 @app_page_login_required
 def delete_card(card_id):
     card = Card.query.get_or_404(card_id)
     if not card_action_allowed(card, "cards.delete"):
         return jsonify({'error': 'Unauthorized'}), 403
+    bg_image_id = card.print_bg_image_id
+    upload_store.release(card.profile_pic)
+    upload_store.release(card.banner_pic)
+    delete_card_views(card.id)
     db.session.delete(card)
+    db.session.flush()
+    release_background_image(bg_image_id)
     db.session.commit()
     return jsonify({'success': True})
 
@@ -579,25 +1027,45 @@ def update_card_label(card_id):
     return jsonify({'success': True})
 
 @app.route("/card/<int:card_id>/download")
+@public_route
+@read_replica
 def download_contact(card_id):
-    card = Card.query.get_or_404(card_id)
-
-    vcard = f"""BEGIN:VCARD
-VERSION:3.0
-FN:{card.name}
-ORG:{card.company}
-TITLE:{card.designation}
-TEL:{card.phone}
-EMAIL:{card.email}
-URL:{card.website}
-END:VCARD
-"""
-
-    return Response(
-        vcard,
-        mimetype="text/vcard",
-        headers={"Content-Disposition": f"attachment;filename={card.name}.vcf"}
-    )
+    """Serve the card as a vCard (3.0 by default, ?version=4.0 for 4.0)."""
+    vcard_version = request.args.get('version', '3.0')
+    if vcard_version not in VCARD_VERSIONS:
+        return jsonify({'error': 'Invalid version. Use 3.0 or 4.0'}), 400
+
+    # The ETag and the cache key only need the version and the card URL (which
+    # follows the request host), so revalidations and cache hits never load
+    # the full card row.
+    meta = db.session.query(Card.name, Card.version).filter_by(id=card_id).first()
+    if meta is None:
+        abort(404)
+    card_url = url_for("view_card", card_id=card_id, _external=True)
+    etag = vcard_etag(card_id, meta.version, vcard_version, card_url)
+
+    if request.if_none_match.contains(etag):
+        return vcard_response(meta.name, etag)
+
+    cache_key = (card_id, meta.version or 0, vcard_version, card_url)
+    body = vcard_cache.get(cache_key)
+    if body is None:
+        card = Card.query.get_or_404(card_id)
+        body = build_vcard(card, vcard_version, photo=vcard_photo(card), card_url=card_url)
+        vcard_cache.set(cache_key, body)
+    return vcard_response(meta.name, etag, body)
+
+def vcard_response(name, etag, body=None):
+    """vCard download response; without ``body`` a 304 (also used by asgi.py)."""
+    if body is None:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="text/vcard")
+        response.headers["Content-Disposition"] = vcard_content_disposition(name)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
 
 @app.route("/card/<int:card_id>/upload_bg_image", methods=["POST"])
 @app_page_login_required
@@ -619,28 +1087,57 @@ def upload_bg_image(card_id):
     if file.content_type not in allowed_types:
         return jsonify({'error': 'Invalid file type. Use PNG or JPG'}), 400
     
-    # Read and store binary data
-    image_data = file.read()
+    # Validate, strip metadata and scale to print resolution
+    try:
+        image_data, mime = prepare_print_background(file.read())
+    except InvalidImageError:
+        return jsonify({'error': 'Invalid image file'}), 400
     
-    # Store in database
-    card.print_bg_image = image_data
-    card.print_bg_image_mime = file.content_type
+    # Store in database (deduplicated by content hash)
+    old_image_id = card.print_bg_image_id
+    image = store_background_image(image_data, mime)
+    card.print_bg_image_id = image.id
+    card.print_bg_image_mime = image.mime
+    db.session.flush()
+    if old_image_id != image.id:
+        release_background_image(old_image_id)
     db.session.commit()
     
     return jsonify({'success': True})
 
 @app.route("/card/<int:card_id>/get_bg_image")
 @app_page_login_required
+@read_replica
 def get_bg_image(card_id):
     """Retrieve background image for printable card"""
     card = Card.query.get_or_404(card_id)
     if not card_action_allowed(card, "cards.print"):
         return jsonify({'error': 'Unauthorized'}), 403
     
-    if not card.print_bg_image:
+    image = None
+    if card.print_bg_image_id is not None:
+        image = db.session.get(BackgroundImage, card.print_bg_image_id)
+    if image is None:
         return jsonify({'error': 'No background image'}), 404
-    
-    return Response(card.print_bg_image, mimetype=card.print_bg_image_mime)
+
+    # Revalidation is answered from metadata alone; the blob is never loaded.
+    if request.if_none_match.contains(image.sha256):
+        response = Response(status=304)
+    else:
+        response = Response(image.data, mimetype=image.mime)
+    response.set_etag(image.sha256)
+    response.last_modified = image.created_at
+
+    response.cache_control.private = True
+    if request.args.get('v') == image.sha256[:16]:
+        response.cache_control.max_age = BG_IMAGE_VERSIONED_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+    if response.status_code == 304:
+        return response
+    return response.make_conditional(request, accept_ranges=True, complete_length=image.size)
 
 @app.route("/card/<int:card_id>/delete_bg_image", methods=["POST"])
 @app_page_login_required
@@ -650,8 +1147,11 @@ def delete_bg_image(card_id):
     if not card_action_allowed(card, "cards.design"):
         return jsonify({'error': 'Unauthorized'}), 403
 
-    card.print_bg_image = None
+    old_image_id = card.print_bg_image_id
+    card.print_bg_image_id = None
     card.print_bg_image_mime = None
+    db.session.flush()
+    release_background_image(old_image_id)
     db.session.commit()
 
     # Tell the designer what (if any) template BG should now show instead
@@ -663,5 +1163,157 @@ def delete_bg_image(card_id):
     )
     return jsonify({'success': True, 'template_bg_url': template_bg_url})
 
+# ───────── METRICS ─────────
+
+@app.route("/metrics")
+@public_route
+def metrics():
+    """Request, SQL and span histograms in Prometheus text format (utils/request_metrics.py)."""
+    token = app.config.get("METRICS_TOKEN")
+    if not token:
+        # Not exposed until a scrape token is configured.
+        abort(404)
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        abort(401)
+    response = Response(request_metrics.render(), mimetype=PROMETHEUS_MIMETYPE)
+    response.cache_control.no_store = True
+    return response
+
+# ───────── CLI ─────────
+
+uploads_cli = AppGroup("uploads", help="Maintain the content-addressed upload store.")
+
+
+@uploads_cli.command("gc")
+def uploads_gc_command():
+    """Delete uploaded files no card has referenced for an hour, and stray files with no record."""
+    removed = upload_store.collect_garbage()
+    click.echo(f"Removed {removed} unreferenced upload(s).")
+
+
+@uploads_cli.command("migrate")
+def uploads_migrate_command():
+    """Move legacy prefix-named uploads into the content-addressed store."""
+    updated = upload_store.import_legacy()
+    click.echo(f"Moved {updated} card picture(s) into the upload store.")
+
+
+app.cli.add_command(uploads_cli)
+
+views_cli = AppGroup("views", help="Maintain card view analytics.")
+
+
+@views_cli.command("compact")
+@click.option("--days", type=int, default=None,
+              help="Delete raw view rows older than this (default: VIEW_RETENTION_DAYS).")
+@click.option("--hourly-days", type=int, default=None,
+              help="Delete hourly rollups older than this (default: VIEW_HOURLY_RETENTION_DAYS).")
+def views_compact_command(days, hourly_days):
+    """Drop raw views and hourly rollups past retention; daily rollups stay."""
+    view_recorder.flush()
+    days = app.config["VIEW_RETENTION_DAYS"] if days is None else days
+    hourly_days = app.config["VIEW_HOURLY_RETENTION_DAYS"] if hourly_days is None else hourly_days
+    deleted_views, deleted_hourly = compact_views(days, hourly_days)
+    click.echo(f"Deleted {deleted_views} raw view row(s) and {deleted_hourly} hourly rollup row(s).")
+
+
+app.cli.add_command(views_cli)
+
+cards_cli = AppGroup("cards", help="Bulk card operations.")
+
+
+@cards_cli.command("export")
+@click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv", show_default=True)
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True, allow_dash=True), default="-",
+              help="File to write (default: stdout).")
+@click.option("--user-id", type=int, default=None, help="Only export cards owned by this user.")
+@click.option("--base-url", default="http://localhost", show_default=True, help="Host used for card URLs.")
+@click.option("--photos", is_flag=True, help="Embed profile photos in the vCards.")
+def cards_export_command(fmt, output, user_id, base_url, photos):
+    """Stream cards to a VCF, CSV, JSONL or ZIP file."""
+    count = 0
+    with app.test_request_context(base_url=base_url), click.open_file(output, "wb") as fh:
+        chunks = export_cards(
+            fmt,
+            lambda card_id: url_for("view_card", card_id=card_id, _external=True),
+            user_id=user_id,
+            photo_for=vcard_photo if photos else None,
+        )
+        for chunk in chunks:
+            fh.write(chunk)
+            count += len(chunk)
+    click.echo(f"Wrote {count} bytes.", err=True)
+
+
+@cards_cli.command("import")
+@click.argument("source", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--user-id", type=int, required=True, help="Owner of the imported cards.")
+@click.option("--format", "fmt", type=click.Choice(IMPORT_FORMATS), default=None,
+              help="Input format (default: from the file extension).")
+@click.option("--template", type=click.Choice(sorted(TEMPLATE_PRESETS)), default=None,
+              help="Apply this print template to every card.")
+@click.option("--dry-run", is_flag=True, help="Validate only.")
+def cards_import_command(source, user_id, fmt, template, dry_run):
+    """Create cards in bulk from a CSV or JSONL file ('-' for stdin)."""
+    fmt = fmt or ("jsonl" if source.name.endswith((".jsonl", ".ndjson")) else "csv")
+    if not db.session.get(User, user_id):
+        raise click.UsageError(f"No user with id {user_id}.")
+    result = run_card_import(source, fmt, user_id, template, dry_run=dry_run)
+    for error in result.errors:
+        click.echo(f"row {error['row']}: {error['error']}", err=True)
+    verb = "Validated" if dry_run else "Imported"
+    click.echo(f"{verb} {result.created} card(s); {result.failed} row(s) failed.")
+
+
+@cards_cli.command("print-sheet")
+@click.option("--ids", default=None, help="Comma-separated card ids.")
+@click.option("--user-id", type=int, default=None, help="Every card owned by this user.")
+@click.option("--sheet", type=click.Choice(sorted(SHEET_SIZES)), default="a4", show_default=True)
+@click.option("--per-sheet", type=click.Choice([str(n) for n in sorted(SHEET_LAYOUTS)]), default="10", show_default=True)
+@click.option("--no-crop-marks", is_flag=True, help="Leave out crop marks.")
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True, allow_dash=True), required=True)
+@click.option("--base-url", default="http://localhost", show_default=True, help="Host used for QR code URLs.")
+def cards_print_sheet_command(ids, user_id, sheet, per_sheet, no_crop_marks, output, base_url):
+    """Impose cards N-up onto a multi-page PDF."""
+    if ids:
+        card_ids = [int(card_id) for card_id in ids.split(",") if card_id.strip()]
+    elif user_id is not None:
+        card_ids = [row.id for row in db.session.query(Card.id).filter_by(user_id=user_id).order_by(Card.id)]
+    else:
+        raise click.UsageError("Pass --ids or --user-id.")
+
+    with app.test_request_context(base_url=base_url), click.open_file(output, "wb") as fh:
+        response = print_sheet_response(card_ids, sheet, int(per_sheet), crop_marks=not no_crop_marks)
+        for chunk in response.response:
+            fh.write(chunk)
+    click.echo(f"Wrote sheets for {len(card_ids)} card(s).", err=True)
+
+
+@cards_cli.command("normalize-layouts")
+def cards_normalize_layouts_command():
+    """Rewrite stored print layouts in canonical form; report invalid ones."""
+    rows = db.session.execute(
+        db.select(Card.id, Card.print_layout_json)
+        .where(Card.print_layout_json.is_not(None))
+    ).all()
+    updated, invalid = 0, []
+    for card_id, stored in rows:
+        try:
+            canonical = layout_json(normalize_layout(json.loads(stored)))
+        except (ValueError, TypeError):
+            invalid.append(card_id)
+            continue
+        if canonical != stored:
+            db.session.execute(db.update(Card).where(Card.id == card_id).values(print_layout_json=canonical))
+            updated += 1
+    db.session.commit()
+    click.echo(f"Normalized {updated} layout(s).")
+    if invalid:
+        click.echo(f"Invalid layouts left unchanged on card(s): {', '.join(map(str, invalid))}", err=True)
+
+
+app.cli.add_command(cards_cli)
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+ASGI entry point for the async serving mode.
+
+    uvicorn asgi:application --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:application
+
+The public, read-heavy routes below are answered on the event loop when
+they can be served from what is already cached (rendered card page, vCard,
+QR image); everything else - and every miss - goes to the regular Flask app
+(see utils/async_serving.py). Responses match the Flask views they shadow.
+"""
+import uuid
+from contextlib import nullcontext
+
+from app import app, qr_response, vcard_response
+from models import db, Card
+from utils.async_serving import AsyncPublicApp
+from utils.db_routing import replica_reads, wrote_recently
+from utils.page_cache import page_cache
+from utils.qr_codes import QR_MIMETYPES, render_qr
+from utils.vcard import VCARD_VERSIONS, vcard_cache, vcard_etag
+from utils.view_recorder import view_recorder
+
+
+application = AsyncPublicApp(app)
+application.on_shutdown(view_recorder.flush)
+
+
+def _reads_for(session):
+    """Replica reads, unless the visitor's own recent write may not be there yet."""
+    return nullcontext() if wrote_recently(session) else replica_reads()
+
+
+def _cached_card_page(card_id, session):
+    with _reads_for(session):
+        meta = db.session.query(Card.version).filter_by(id=card_id).first()
+    if meta is None:
+        return None
+    return page_cache.get(card_id, meta.version)
+
+
+@application.route(r"/card/(?P<card_id>\d+)")
+async def view_card(request, card_id):
+    card_id = int(card_id)
+    session = application.open_session(request)
+    # Signed-in visitors may be the owner (edit controls, no shared page);
+    # resolving them needs IAM, so Flask handles them.
+    if session.get("auth_token"):
+        return None
+    html = await application.run_sync(_cached_card_page, card_id, session)
+    if html is None:
+        return None
+
+    if "anon_id" not in session:
+        session["anon_id"] = str(uuid.uuid4())
+    application.defer(view_recorder.record, card_id, session_id=session["anon_id"])
+
+    response = app.response_class(html, mimetype="text/html")
+    application.save_session(session, response)
+    return response
+
+
+@application.route(r"/card/(?P<card_id>\d+)/download")
+async def download_contact(request, card_id):
+    card_id = int(card_id)
+    vcard_version = request.args.get('version', '3.0')
+    if vcard_version not in VCARD_VERSIONS:
+        return None
+    card_url = application.url_for(request, "view_card", card_id=card_id)
+    session = application.open_session(request)
+
+    def lookup():
+        with _reads_for(session):
+            meta = db.session.query(Card.name, Card.version).filter_by(id=card_id).first()
+        if meta is None:
+            return None, None
+        return meta, vcard_cache.get((card_id, meta.version or 0, vcard_version, card_url))
+
+    meta, body = await application.run_sync(lookup)
+    if meta is None:
+        return None
+    etag = vcard_etag(card_id, meta.version, vcard_version, card_url)
+    if request.if_none_match.contains(etag):
+        return vcard_response(meta.name, etag)
+    if body is None:
+        return None
+    return vcard_response(meta.name, etag, body)
+
+
+@application.route(r"/card/(?P<card_id>\d+)/qr")
+async def card_qr(request, card_id):
+    card_id = int(card_id)
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in QR_MIMETYPES:
+        return None
+    card_url = application.url_for(request, "view_card", card_id=card_id)
+
+    def lookup():
+        # A miss (e.g. a card the replica has not seen yet) falls through to
+        # Flask, which reads from the primary.
+        with replica_reads():
+            if not db.session.query(Card.id).filter_by(id=card_id).first():
+                return None
+        return render_qr(card_url, fmt=fmt)
+
+    rendered = await application.run_sync(lookup)
+    if rendered is None:
+        return None
+    body, etag = rendered
+    return qr_response(request, body, etag, fmt)
@@ -12,9 +12,15 @@ Security Notes:
 - Always validate user input and check permissions before database operations
 - Never trust client-side data - always verify on server side
 """
+from collections import namedtuple
 from functools import wraps
-from flask import g, redirect, url_for, flash, jsonify, request
+from flask import g, redirect, url_for, flash, jsonify, request, session, current_app
+from sqlalchemy import event
+from config import Config
+from models import User
 from utils.db_utils import get_db
+from utils.ttl_cache import TTLCache
+from utils.request_metrics import timed
 from utils.permissions import (
     ROLE_HIERARCHY, ROLE_VIEWER, ROLE_ADMIN, ROLE_ORGANIZER,
     VALID_ROLES, is_valid_role, role_has_permission
@@ -28,8 +34,83 @@ from He5Lib.he5IAMConnect import (
     api_login_required as iam_api_login_required,   # for API routes (returns JSON 401 on unauth)
     getUserName,
     getUserEmail,
+    load_iam_data,
 )
 
+# IAM user id -> resolved DB identity. Saves the per-request User lookup and
+# write in get_or_create_user; entries expire after USER_CACHE_TTL seconds,
+# which also bounds how long another worker can serve a stale role.
+CachedAppUser = namedtuple('CachedAppUser', ['id', 'role', 'name', 'email'])
+_user_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+
+def _cache_user(user):
+    identity = CachedAppUser(user.id, user.role or ROLE_VIEWER, user.name, user.email)
+    if user.google_id:
+        _user_cache.set(str(user.google_id), identity)
+    return identity
+
+
+def invalidate_cached_user(iam_user_id):
+    """Drop the cached identity for an IAM user (e.g. after a role change)."""
+    _user_cache.pop(str(iam_user_id))
+
+
+@event.listens_for(User.role, 'set')
+def _invalidate_on_role_change(target, value, oldvalue, initiator):
+    if target.google_id and value != oldvalue:
+        invalidate_cached_user(target.google_id)
+
+
+# Endpoints that never need IAM data up front (Flask's built-in static route
+# serves uploads and the template background images).
+PUBLIC_ENDPOINTS = {'static'}
+
+
+def public_route(f):
+    """
+    Mark a view as public.
+
+    Public views skip the eager IAM load in before_request; identity is only
+    resolved if the view or its template actually asks for the current user.
+
+    Usage:
+        @app.route('/card/<int:card_id>')
+        @public_route
+        def view_card(card_id):
+            ...
+    """
+    f.is_public_route = True
+    return f
+
+
+def is_public_request():
+    """Return True when the current request targets a public/static endpoint."""
+    endpoint = request.endpoint
+    if not endpoint:
+        return False
+    if endpoint in PUBLIC_ENDPOINTS:
+        return True
+    view = current_app.view_functions.get(endpoint)
+    return bool(getattr(view, 'is_public_route', False))
+
+
+def ensure_iam_context():
+    """
+    Load IAM data for the current request, at most once.
+
+    Called eagerly for protected routes and lazily (via get_iam_user_id) for
+    public ones. On public routes a visitor without an auth token in the
+    session has nothing for IAM to resolve, so the call is skipped entirely.
+    """
+    if g.get('iam_context_loaded'):
+        return
+    g.iam_context_loaded = True
+    if is_public_request() and not session.get('auth_token'):
+        return
+    with timed('iam'):
+        load_iam_data()
+
 
 def get_iam_user_id():
     """
@@ -38,9 +119,39 @@ def get_iam_user_id():
     Returns:
         str or None: IAM user ID, or None if not authenticated
     """
+    ensure_iam_context()
     return getattr(g, 'user_id', None)
 
 
+def get_current_db_user():
+    """
+    Get the current user's database row, loaded at most once per request.
+
+    The User (or None) is memoized on g.db_user, so the context processor and
+    the permission helpers share one lookup.
+
+    Returns:
+        User or None: User object, or None if not authenticated or user not found
+    """
+    if 'db_user' in g:
+        return g.db_user
+
+    db_user_id = g.get('db_user_id')
+    if db_user_id:
+        # Identity already resolved (login decorator or user cache): load by PK.
+        g.db_user = get_db().get(User, db_user_id)
+        return g.db_user
+
+    iam_user_id = get_iam_user_id()
+    if not iam_user_id:
+        return None
+
+    user = get_db().query(User).filter(User.google_id == str(iam_user_id)).first()
+    g.db_user = user
+    g.db_user_id = user.id if user else None
+    return user
+
+
 def get_user_id():
     """
     Get the current user's database ID from IAM ID.
@@ -49,22 +160,28 @@ def get_user_id():
     Returns:
         int or None: Database user ID, or None if not authenticated or user not found
     """
+    if 'db_user_id' in g:
+        return g.db_user_id
+
     iam_user_id = get_iam_user_id()
     if not iam_user_id:
         return None
-    
-    db = get_db()
-    try:
-        from models import User
-        user = db.query(User).filter(User.google_id == str(iam_user_id)).first()
-        return user.id if user else None
-    finally:
-        db.close()
+
+    cached = _user_cache.get(str(iam_user_id))
+    if cached:
+        g.db_user_id = cached.id
+        return cached.id
+
+    user = get_current_db_user()
+    return user.id if user else None
 
 
 def get_or_create_user(iam_user_id, name=None, email=None):
     """
     Get or create a user in the database from IAM user ID.
+
+    Only commits when a row is created or a missing profile field is filled
+    in; the caller's request session is left open.
     
     Args:
         iam_user_id: IAM user ID
@@ -74,45 +191,46 @@ def get_or_create_user(iam_user_id, name=None, email=None):
     Returns:
         User: User object
     """
-    from utils.db_utils import get_db
-    from models import User
-    
     db = get_db()
-    try:
-        user = db.query(User).filter(User.google_id == str(iam_user_id)).first()
-        
-        if not user:
-            # Get user info from IAM if available
-            try:
-                from He5Lib.he5IAMConnect import getUserName, getUserEmail
-                if not name:
-                    name = getUserName() or None
-                if not email:
-                    email = getUserEmail() or None
-            except:
-                pass
-            
-            user = User(
-                google_id=str(iam_user_id),
-                name=name,
-                email=email,
-                role=ROLE_VIEWER
-            )
-            db.add(user)
+    user = db.query(User).filter(User.google_id == str(iam_user_id)).first()
+
+    if not user:
+        # Get user info from IAM if available
+        try:
+            if not name:
+                name = getUserName() or None
+            if not email:
+                email = getUserEmail() or None
+        except:
+            pass
+
+        user = User(
+            google_id=str(iam_user_id),
+            name=name,
+            email=email,
+            role=ROLE_VIEWER
+        )
+        db.add(user)
+        db.commit()
+    else:
+        # Fill in profile fields that are still empty
+        changed = False
+        if name and not user.name:
+            user.name = name
+            changed = True
+        if email and not user.email:
+            user.email = email
+            changed = True
+        if changed:
             db.commit()
-            db.refresh(user)
-        else:
-            # Update user info if provided
-            if name and not user.name:
-                user.name = name
-            if email and not user.email:
-                user.email = email
-            if name or email:
-                db.commit()
-        
-        return user
-    finally:
-        db.close()
+
+    _cache_user(user)
+    return user
+
+
+def _profile_is_current(cached, name, email):
+    """True when get_or_create_user would not change anything for this identity."""
+    return not ((name and not cached.name) or (email and not cached.email))
 
 
 def _ensure_app_user_created():
@@ -121,7 +239,11 @@ def _ensure_app_user_created():
     User row for the currently authenticated IAM user.
 
     - Uses g.user_id (external auth id) and optional g.user_name / g.user_email.
-    - Stores the DB user id on g.db_user_id for downstream use.
+    - Stores the DB user id on g.db_user_id and the role on g.user_role.
+    - Served from the user cache in the steady state (no queries, no writes).
+
+    Returns:
+        CachedAppUser or None
     """
     iam_user_id = get_iam_user_id()
     if not iam_user_id:
@@ -130,17 +252,15 @@ def _ensure_app_user_created():
     name = getattr(g, 'user_name', None)
     email = getattr(g, 'user_email', None)
 
-    user = get_or_create_user(iam_user_id, name=name, email=email)
-    try:
-        g.user_role = getattr(user, 'role', ROLE_VIEWER) or ROLE_VIEWER
-    except Exception:
-        pass
-    try:
-        g.db_user_id = user.id
-    except Exception:
-        # g may not allow attribute assignment in some edge cases; ignore.
-        pass
-    return user
+    identity = _user_cache.get(str(iam_user_id))
+    if identity is None or not _profile_is_current(identity, name, email):
+        user = get_or_create_user(iam_user_id, name=name, email=email)
+        identity = _cache_user(user)
+        g.db_user = user
+
+    g.user_role = identity.role or ROLE_VIEWER
+    g.db_user_id = identity.id
+    return identity
 
 
 def app_page_login_required(f):
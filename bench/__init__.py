@@ -0,0 +1,13 @@
+"""
+Offline load and benchmark suite.
+
+    python -m bench run --users 50 --concurrency 8 --requests 500
+    python -m bench compare bench/baselines/old.json bench/baselines/new.json
+
+The app is imported with a local IAM stub (bench/iam_stub) in place of
+He5Lib, against a fresh SQLite file or any DATABASE_URL, seeded with
+bench users, cards and views (bench/seed.py). Each scenario
+(bench/scenarios.py) is driven through the Flask test client from a pool
+of worker threads, and the run is written as a JSON baseline:
+p50/p95/p99 latency, throughput and SQL queries per request.
+"""
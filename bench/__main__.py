@@ -0,0 +1,128 @@
+"""
+Command line for the benchmark suite (see bench/__init__.py).
+
+    python -m bench run [--database-url URL] [--users N] [--scenario NAME ...]
+    python -m bench compare OLD.json NEW.json [--threshold PERCENT]
+"""
+import json
+import sys
+
+import click
+
+from bench import runner
+
+
+# Same order as bench.scenarios.SCENARIOS, which is only imported with the app.
+SCENARIO_NAMES = (
+    'view_card', 'download_contact', 'dashboard', 'card_designer',
+    'print_card', 'save_layout', 'upload_bg_image',
+)
+
+
+@click.group()
+def cli():
+    """Offline load and benchmark suite."""
+
+
+@cli.command("run")
+@click.option("--database-url", default=None,
+              help="Database to seed and use (default: a fresh SQLite file). Reused if already seeded.")
+@click.option("--users", default=50, show_default=True, help="Bench users to seed.")
+@click.option("--cards-per-user", default=4, show_default=True)
+@click.option("--views-per-card", default=20, show_default=True)
+@click.option("--scenario", "scenarios", multiple=True, type=click.Choice(SCENARIO_NAMES),
+              help="Scenario to run (repeatable; default: all).")
+@click.option("--concurrency", default=8, show_default=True, help="Worker threads per scenario.")
+@click.option("--requests", default=500, show_default=True, help="Measured requests per scenario.")
+@click.option("--warmup", default=50, show_default=True, help="Unmeasured requests before each scenario.")
+@click.option("--seed", "rng_seed", default=0, show_default=True, help="Random seed for data and request mix.")
+@click.option("--output", type=click.Path(dir_okay=False),
+              help="Baseline file to write (default: bench/baselines/<commit>.json).")
+@click.option("--compare", "compare_with", type=click.Path(exists=True, dir_okay=False),
+              help="Baseline to compare the new run against.")
+@click.option("--threshold", default=10.0, show_default=True, help="Regression threshold for --compare, in percent.")
+def run_command(database_url, users, cards_per_user, views_per_card, scenarios, concurrency,
+                requests, warmup, rng_seed, output, compare_with, threshold):
+    """Seed the database, run the scenarios and write a JSON baseline."""
+    database_url = runner.setup_environment(database_url)
+
+    # Imported only now, with the IAM stub and database in place.
+    from app import app
+    from models import db
+    from bench.scenarios import SCENARIOS, Fixture
+    from bench.seed import seed
+    from utils.view_recorder import view_recorder
+
+    with app.app_context():
+        seeded, inserted = seed(users, cards_per_user, views_per_card, rng_seed)
+        counter = runner.QueryCounter()
+        counter.install(db.engines.values())
+    click.echo(f"{'Seeded' if inserted else 'Reusing'} {len(seeded)} bench users on {database_url}")
+
+    all_card_ids = [card_id for _, _, card_ids in seeded for card_id in card_ids]
+    fixtures = [Fixture(token, card_ids, all_card_ids) for token, _, card_ids in seeded if card_ids]
+    if not fixtures:
+        raise click.ClickException("No bench cards to run against")
+
+    results = {}
+    for name in scenarios or SCENARIO_NAMES:
+        results[name] = runner.run_scenario(
+            app, SCENARIOS[name], fixtures, counter, requests, concurrency, warmup, rng_seed,
+        )
+        summary = results[name]
+        latency = summary["latency_ms"]
+        click.echo(
+            f"{name:<18} {summary['throughput_rps']:>9.1f} req/s  "
+            f"p50 {latency['p50']:>8.2f}  p95 {latency['p95']:>8.2f}  p99 {latency['p99']:>8.2f} ms  "
+            f"{summary['queries_per_request']['mean']:>5.1f} queries  {summary['errors']} errors"
+        )
+    view_recorder.flush()
+
+    result = {
+        "meta": runner.baseline_meta(
+            app, database_url,
+            {"users": users, "cards_per_user": cards_per_user, "views_per_card": views_per_card,
+             "rng_seed": rng_seed, "inserted": inserted},
+            {"concurrency": concurrency, "requests": requests, "warmup": warmup},
+        ),
+        "scenarios": results,
+    }
+    click.echo(f"Baseline written to {runner.write_baseline(result, output)}")
+
+    if compare_with:
+        with open(compare_with) as fh:
+            sys.exit(_report(json.load(fh), result, threshold))
+
+
+@cli.command("compare")
+@click.argument("old", type=click.Path(exists=True, dir_okay=False))
+@click.argument("new", type=click.Path(exists=True, dir_okay=False))
+@click.option("--threshold", default=10.0, show_default=True, help="Regression threshold, in percent.")
+def compare_command(old, new, threshold):
+    """Diff two baselines; exits with status 1 if NEW regressed."""
+    with open(old) as fh:
+        old_result = json.load(fh)
+    with open(new) as fh:
+        new_result = json.load(fh)
+    sys.exit(_report(old_result, new_result, threshold))
+
+
+def _report(old, new, threshold):
+    for label, result in (("old", old), ("new", new)):
+        meta = result["meta"]
+        click.echo(f"{label}: {meta['commit']}{' (dirty)' if meta['dirty'] else ''} "
+                   f"{meta['database']} {meta['created_at']}")
+    if old["meta"]["seed"] != new["meta"]["seed"] or old["meta"]["run"] != new["meta"]["run"]:
+        click.echo("warning: runs used different seed or load settings")
+
+    rows = runner.compare_baselines(old, new, threshold)
+    for name, metric, before, after, change, regressed in rows:
+        click.echo(f"{name:<18} {metric:<8} {before:>10.2f} -> {after:>10.2f}  {change:>+7.1f}%"
+                   f"{'  REGRESSION' if regressed else ''}")
+    regressions = sum(1 for row in rows if row[-1])
+    click.echo(f"{regressions} regression(s) (threshold {threshold:g}%)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,55 @@
+"""
+Local stand-in for He5Lib.he5IAMConnect, used by the benchmark suite.
+
+The session's auth_token is the IAM user id itself (bench users are seeded
+with google_id = token), so no IAM service is contacted. IAM_STUB_LATENCY_MS
+adds a fixed delay to load_iam_data to model the round trip to a real IAM.
+"""
+import os
+import time
+from functools import wraps
+
+from flask import g, jsonify, redirect, session
+
+
+IAM_STUB_LATENCY = float(os.getenv("IAM_STUB_LATENCY_MS", "0")) / 1000
+
+
+def load_iam_data():
+    if IAM_STUB_LATENCY:
+        time.sleep(IAM_STUB_LATENCY)
+    token = session.get("auth_token")
+    if token:
+        g.user_id = token
+        g.user_name = f"Bench {token}"
+        g.user_email = f"{token}@bench.invalid"
+
+
+def get_session_token_from_auth_token(auth_token):
+    return auth_token
+
+
+def getUserName():
+    return getattr(g, "user_name", None)
+
+
+def getUserEmail():
+    return getattr(g, "user_email", None)
+
+
+def page_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not getattr(g, "user_id", None):
+            return redirect("/login")
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not getattr(g, "user_id", None):
+            return jsonify({"error": "Unauthorized"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
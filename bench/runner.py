@@ -0,0 +1,234 @@
+"""
+Drive scenarios against the app and summarise them as a JSON baseline.
+
+setup_environment must run before anything imports the app: it puts the
+IAM stub ahead of any installed He5Lib and points DATABASE_URL at the
+benchmark database.
+"""
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+IAM_STUB_PATH = Path(__file__).resolve().parent / "iam_stub"
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+# Statuses that count as a successful request; anything else is an error.
+OK_STATUSES = {200, 201, 204, 302, 304}
+
+# Settings recorded with every baseline, since they change what is measured.
+RECORDED_SETTINGS = (
+    "VIEW_FLUSH_INTERVAL", "VIEW_COUNTING", "PAGE_CACHE_BACKEND", "USER_CACHE_TTL", "REPLICA_STICKY_SECONDS",
+)
+
+
+def setup_environment(database_url=None):
+    """Install the IAM stub and choose the database; returns the database URL."""
+    if "He5Lib" in sys.modules or "app" in sys.modules:
+        raise RuntimeError("bench.runner.setup_environment must run before the app is imported")
+    sys.path.insert(0, str(IAM_STUB_PATH))
+    sys.path.insert(1, str(ROOT))
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="cardbench-"), "bench.db")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "bench")
+    return database_url
+
+
+# ───────── Query counting ─────────
+
+class QueryCounter:
+    """Counts SQL statements executed by the current thread, across all engines."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def install(self, engines):
+        from sqlalchemy import event
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+# ───────── Running ─────────
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    rank = math.ceil(fraction * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def summarize(samples, wall_time):
+    """
+    Summary of one scenario run.
+
+    Args:
+        samples: list of (status code, seconds, SQL statements) per request
+        wall_time: seconds from the first request to the last response
+    """
+    latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+    queries = [count for _, _, count in samples]
+    statuses = {}
+    for status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for status, _, _ in samples if status not in OK_STATUSES),
+        "statuses": statuses,
+        "throughput_rps": round(len(samples) / wall_time, 2) if wall_time else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "queries_per_request": {
+            "mean": round(sum(queries) / len(queries), 2),
+            "max": max(queries),
+        },
+    }
+
+
+def run_scenario(app, scenario, fixtures, counter, requests, concurrency, warmup=0, rng_seed=0):
+    """
+    Send ``requests`` requests (after ``warmup`` unmeasured ones) from
+    ``concurrency`` worker threads, each with its own client and fixture.
+    """
+    def worker(index, count, measure):
+        fixture = fixtures[index % len(fixtures)]
+        rng = random.Random(f"{rng_seed}-{scenario.name}-{index}-{measure}")
+        client = app.test_client()
+        if scenario.owner:
+            with client.session_transaction() as session:
+                session["auth_token"] = fixture.token
+        samples = []
+        for _ in range(count):
+            counter.reset()
+            started = time.perf_counter()
+            response = scenario.request(client, fixture, rng)
+            response.close()
+            samples.append((response.status_code, time.perf_counter() - started, counter.count))
+        return samples
+
+    def drive(total, measure):
+        shares = [total // concurrency + (1 if index < total % concurrency else 0) for index in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(worker, index, share, measure) for index, share in enumerate(shares) if share]
+            return [sample for future in futures for sample in future.result()]
+
+    if warmup:
+        drive(warmup, False)
+    started = time.perf_counter()
+    samples = drive(requests, True)
+    return summarize(samples, time.perf_counter() - started)
+
+
+# ───────── Baselines ─────────
+
+def git_revision():
+    """(commit, dirty) of the working tree, or (None, None) outside git."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def baseline_meta(app, database_url, seed_options, run_options):
+    from sqlalchemy.engine import make_url
+    commit, dirty = git_revision()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "database": make_url(database_url).get_backend_name(),
+        "seed": seed_options,
+        "run": run_options,
+        "settings": {name: app.config.get(name) for name in RECORDED_SETTINGS},
+    }
+
+
+def write_baseline(result, path=None):
+    if path is None:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        commit = result["meta"]["commit"] or "nogit"
+        suffix = "-dirty" if result["meta"]["dirty"] else ""
+        path = BASELINE_DIR / f"{commit}{suffix}.json"
+    path = Path(path)
+    path.write_text(json.dumps(result, indent=2, sort_keys=True) + "\n")
+    return path
+
+
+# Compared metrics: (label, path into the scenario summary, True if higher is better)
+COMPARED_METRICS = (
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p95 ms", ("latency_ms", "p95"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("req/s", ("throughput_rps",), True),
+    ("queries", ("queries_per_request", "mean"), False),
+)
+
+# Concurrent runs interleave differently (cache fills, de-duplication hits),
+# so the mean query count wobbles slightly between identical commits.
+QUERY_TOLERANCE = 0.1
+
+
+def _metric(summary, path):
+    for key in path:
+        summary = summary.get(key) if isinstance(summary, dict) else None
+    return summary
+
+
+def compare_baselines(old, new, threshold):
+    """
+    Rows of (scenario, metric, old, new, % change, regressed) for the
+    scenarios present in both runs. Latency and throughput regress when
+    they get worse by more than ``threshold`` percent; queries per request
+    regress when the mean grows by more than QUERY_TOLERANCE.
+    """
+    rows = []
+    for name in sorted(set(old["scenarios"]) & set(new["scenarios"])):
+        for label, path, higher_is_better in COMPARED_METRICS:
+            before = _metric(old["scenarios"][name], path)
+            after = _metric(new["scenarios"][name], path)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            worse = -change if higher_is_better else change
+            if label == "queries":
+                regressed = after - before > QUERY_TOLERANCE
+            else:
+                regressed = worse > threshold
+            rows.append((name, label, before, after, change, regressed))
+    return rows
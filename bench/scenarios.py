@@ -0,0 +1,101 @@
+"""
+Benchmark scenarios: one route each, as a visitor or card owner uses it.
+
+A scenario's ``request`` callable gets the worker's test client, the
+worker's Fixture and a random.Random, and returns the response. Owner
+scenarios log the client in as the fixture's user and only touch that
+user's cards; anonymous scenarios pick any seeded card.
+"""
+import io
+from collections import namedtuple
+
+from PIL import Image
+
+from utils.print_layout import ACCENTS, BACKGROUNDS, LAYOUT_ELEMENTS
+
+
+Scenario = namedtuple('Scenario', ['name', 'owner', 'request'])
+
+# Per worker: the bench user it acts as, that user's cards, and all cards.
+Fixture = namedtuple('Fixture', ['token', 'card_ids', 'all_card_ids'])
+
+
+def _any_card(fixture, rng):
+    return rng.choice(fixture.all_card_ids)
+
+
+def _own_card(fixture, rng):
+    return rng.choice(fixture.card_ids)
+
+
+def view_card(client, fixture, rng):
+    return client.get(f"/card/{_any_card(fixture, rng)}")
+
+
+def download_contact(client, fixture, rng):
+    return client.get(f"/card/{_any_card(fixture, rng)}/download")
+
+
+def dashboard(client, fixture, rng):
+    return client.get("/dashboard")
+
+
+def card_designer(client, fixture, rng):
+    return client.get(f"/card/{_own_card(fixture, rng)}/designer")
+
+
+def print_card(client, fixture, rng):
+    return client.get(f"/card/{_own_card(fixture, rng)}/print")
+
+
+def save_layout(client, fixture, rng):
+    # A full save that always changes something, so every request writes.
+    layout = {
+        'positions': {
+            name: {'x': rng.randint(0, 500), 'y': rng.randint(0, 300), 'scale': 1}
+            for name in LAYOUT_ELEMENTS
+        },
+        'background': rng.choice(BACKGROUNDS),
+        'accent': rng.choice(ACCENTS),
+        'show_phone': True,
+        'show_email': True,
+        'custom_text': f"Bench {rng.random()}",
+    }
+    return client.post(f"/card/{_own_card(fixture, rng)}/save_layout", json=layout)
+
+
+# A handful of distinct backgrounds: uploads exercise both new images and
+# the content-hash de-duplication.
+_BACKGROUND_COLORS = ((20, 20, 20), (10, 30, 80), (30, 70, 40), (120, 20, 30))
+_background_images = {}
+
+
+def _background_png(index):
+    if index not in _background_images:
+        buffer = io.BytesIO()
+        Image.new('RGB', (1400, 800), _BACKGROUND_COLORS[index]).save(buffer, 'PNG')
+        _background_images[index] = buffer.getvalue()
+    return _background_images[index]
+
+
+def upload_bg_image(client, fixture, rng):
+    body = _background_png(rng.randrange(len(_BACKGROUND_COLORS)))
+    return client.post(
+        f"/card/{_own_card(fixture, rng)}/upload_bg_image",
+        data={'bg_image': (io.BytesIO(body), 'background.png', 'image/png')},
+        content_type='multipart/form-data',
+    )
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario('view_card', False, view_card),
+        Scenario('download_contact', False, download_contact),
+        Scenario('dashboard', True, dashboard),
+        Scenario('card_designer', True, card_designer),
+        Scenario('print_card', True, print_card),
+        Scenario('save_layout', True, save_layout),
+        Scenario('upload_bg_image', True, upload_bg_image),
+    )
+}
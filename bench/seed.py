@@ -0,0 +1,116 @@
+"""
+Deterministic benchmark data: users, their cards and anonymous views.
+
+Bench users are recognised by their google_id prefix, so a database that
+was seeded before (e.g. a MySQL instance reused between runs) is reused
+as it is instead of being seeded twice.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from models import db, User, Card, CardView
+
+
+USER_PREFIX = "bench-"
+BATCH_SIZE = 1000
+
+THEMES = ('midnight', 'ocean', 'forest', 'sunset', 'slate')
+DESIGNATIONS = ('Engineer', 'Designer', 'Founder', 'Consultant', 'Sales Lead', 'Product Manager')
+
+
+def bench_token(index):
+    """IAM user id / session auth_token of the ``index``-th bench user."""
+    return f"{USER_PREFIX}{index}"
+
+
+def _batched(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def load_fixtures():
+    """
+    Bench users and their cards already in the database.
+
+    Returns:
+        list: (auth token, user id, [card ids]) per bench user, or [] if the
+        database has not been seeded
+    """
+    users = db.session.execute(
+        select(User.id, User.google_id).where(User.google_id.like(f"{USER_PREFIX}%")).order_by(User.id)
+    ).all()
+    cards = {}
+    for card_id, user_id in db.session.execute(
+        select(Card.id, Card.user_id).where(Card.user_id.in_([user.id for user in users])).order_by(Card.id)
+    ):
+        cards.setdefault(user_id, []).append(card_id)
+    return [(user.google_id, user.id, cards.get(user.id, [])) for user in users]
+
+
+def seed(users, cards_per_user, views_per_card, rng_seed=0):
+    """
+    Insert ``users`` bench users with ``cards_per_user`` cards each and
+    ``views_per_card`` anonymous views per card, unless already seeded.
+
+    Returns:
+        tuple: (fixtures as returned by load_fixtures, True if rows were inserted)
+    """
+    fixtures = load_fixtures()
+    if fixtures:
+        return fixtures, False
+
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {
+            'google_id': bench_token(index),
+            'name': f"Bench {index}",
+            'email': f"{bench_token(index)}@bench.invalid",
+            'role': 'viewer',
+            'created_at': now,
+        }
+        for index in range(users)
+    ])
+    user_ids = [user_id for _, user_id, _ in load_fixtures()]
+
+    card_rows = []
+    for user_id in user_ids:
+        for number in range(cards_per_user):
+            card_rows.append({
+                'user_id': user_id,
+                'name': f"Bench Person {user_id}-{number}",
+                'designation': rng.choice(DESIGNATIONS),
+                'company': f"Company {rng.randrange(1000)}",
+                'bio': "Benchmark card. " * rng.randint(1, 8),
+                'phone': f"+1555{rng.randrange(10**7):07d}",
+                'email': f"person{user_id}-{number}@bench.invalid",
+                'address': f"{rng.randint(1, 999)} Bench Street",
+                'website': f"https://example.com/{user_id}/{number}",
+                'linkedin': f"https://linkedin.com/in/bench{user_id}{number}",
+                'theme': rng.choice(THEMES),
+                'created_at': now - timedelta(minutes=len(card_rows)),
+                'views': views_per_card,
+                'version': 1,
+                'print_layout_version': 0,
+            })
+    for batch in _batched(card_rows):
+        db.session.execute(insert(Card), batch)
+
+    fixtures = load_fixtures()
+    view_rows = [
+        {
+            'card_id': card_id,
+            'session_id': f"bench-{card_id}-{number}",
+            'viewed_at': now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+        }
+        for _, _, card_ids in fixtures
+        for card_id in card_ids
+        for number in range(views_per_card)
+    ]
+    for batch in _batched(view_rows):
+        db.session.execute(insert(CardView), batch)
+    db.session.commit()
+    return fixtures, True
+
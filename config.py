@@ -8,14 +8,99 @@ IAM_PATH = os.getenv("IAM_PATH", "")
 BASE_PATH = os.getenv("BASE_PATH", "")
 IAM_AUTH_HEAD_KEY = os.getenv("IAM_AUTH_HEAD_KEY", "A853DG1VNKaEEMBzuP5HDBTQVVAmTX2BPiT5j2Bd")
 
+DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+
+def engine_options(url):
+    """
+    SQLAlchemy engine/pool options for ``url``, from the DB_POOL_* settings.
+
+    Connections idle longer than DB_POOL_RECYCLE seconds are replaced before
+    MySQL's wait_timeout drops them, and every checkout is pinged first.
+    SQLite keeps SQLAlchemy's own pool (an in-memory database cannot be
+    pooled), so only the pre-ping applies there.
+    """
+    options = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1"}
+    if url and not url.startswith("sqlite"):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        )
+    return options
+
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
-    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
+    SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pool size / overflow / timeout / recycle per worker process; see engine_options.
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(DATABASE_URL)
+
+    # Optional read replica (utils/db_routing.py). Read-only routes send their
+    # SELECTs there; a visitor who wrote in the last REPLICA_STICKY_SECONDS
+    # reads from the primary instead, so they never see their change undone.
+    SQLALCHEMY_BINDS = {
+        "replica": {"url": DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL)},
+    } if DATABASE_REPLICA_URL else {}
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
 
     IAM_PATH = IAM_PATH
     BASE_PATH = BASE_PATH
     IAM_AUTH_HEAD_KEY = IAM_AUTH_HEAD_KEY
 
+    # Write-behind view counter (utils/view_recorder.py).
+    # VIEW_FLUSH_INTERVAL=0 writes every view inline.
+    VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))
+    VIEW_FLUSH_SIZE = int(os.getenv("VIEW_FLUSH_SIZE", "200"))
+
+    # Retention for `flask views compact` (utils/view_analytics.py), in days.
+    # Raw CardView rows are kept forever by default (0); hourly rollups for 90 days.
+    VIEW_RETENTION_DAYS = int(os.getenv("VIEW_RETENTION_DAYS", "0"))
+    VIEW_HOURLY_RETENTION_DAYS = int(os.getenv("VIEW_HOURLY_RETENTION_DAYS", "90"))
+
+    # Unique visitors (utils/visitor_sketches.py): "exact" keeps one CardView row
+    # per visitor; "hll" keeps HyperLogLog sketches (~1.6% standard error) and
+    # only writes CardView rows when VIEW_LOG_ROWS=1. Daily sketches follow
+    # VIEW_HOURLY_RETENTION_DAYS.
+    VIEW_COUNTING = os.getenv("VIEW_COUNTING", "exact")
+    VIEW_LOG_ROWS = os.getenv("VIEW_LOG_ROWS", "0") == "1"
+
+    # ASGI serving (asgi.py, utils/async_serving.py): threads for the async
+    # fast paths' database lookups, and for requests handed to Flask.
+    ASYNC_DB_WORKERS = int(os.getenv("ASYNC_DB_WORKERS", "8"))
+    ASYNC_WSGI_WORKERS = int(os.getenv("ASYNC_WSGI_WORKERS", "10"))
+
+    # Request instrumentation (utils/request_metrics.py): Server-Timing response
+    # header, and the bearer token /metrics requires (unset = /metrics is a 404).
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Cache lifetime (seconds) for files served from static/uploads.
+    UPLOAD_MAX_AGE = int(os.getenv("UPLOAD_MAX_AGE", "3600"))
+
+    # Rendered public card pages (utils/page_cache.py): memory | filesystem | none.
+    # "filesystem" shares entries across gunicorn workers on one host.
+    PAGE_CACHE_BACKEND = os.getenv("PAGE_CACHE_BACKEND", "memory")
+    PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR")
+    PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "512"))
+    PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "3600"))
+
+    # Cards per dashboard page / infinite-scroll batch.
+    DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "24"))
+
+    # Server-side print renders (utils/print_renderer.py); defaults to instance/print_cache.
+    PRINT_CACHE_DIR = os.getenv("PRINT_CACHE_DIR")
+    # Renders unused for PRINT_CACHE_MAX_AGE_DAYS are pruned, then the least
+    # recently used ones until the cache fits in PRINT_CACHE_MAX_MB.
+    PRINT_CACHE_MAX_MB = int(os.getenv("PRINT_CACHE_MAX_MB", "512"))
+    PRINT_CACHE_MAX_AGE_DAYS = int(os.getenv("PRINT_CACHE_MAX_AGE_DAYS", "30"))
+
+    # IAM user -> DB user cache in auth_ulties.py (USER_CACHE_TTL=0 disables it).
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+
     # GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
     # GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -0,0 +1,11 @@
+"""
+Gunicorn settings picked up automatically from the project root.
+
+The Procfile runs ``gunicorn app:app``; gunicorn loads this file by default.
+"""
+
+
+def worker_exit(server, worker):
+    # Persist buffered card views before the worker goes away.
+    from utils.view_recorder import view_recorder
+    view_recorder.flush()
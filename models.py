@@ -3,7 +3,10 @@ from flask_login import UserMixin
 from datetime import datetime
 import json
 
-db = SQLAlchemy()
+from utils.db_routing import RoutingSession
+
+# Reads can be routed to a read replica; see utils/db_routing.py
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 # ───────── USER MODEL ─────────
 class User(UserMixin, db.Model):
@@ -15,8 +18,33 @@ class User(UserMixin, db.Model):
     role = db.Column(db.String(20), default='viewer', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# ───────── BACKGROUND IMAGE MODEL ─────────
+class BackgroundImage(db.Model):
+    """Uploaded print background, stored once per distinct image (SHA-256 of the bytes)."""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    mime = db.Column(db.String(50), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    data = db.deferred(db.Column(db.LargeBinary(length=2**24 - 1), nullable=False))  # MEDIUMBLOB on MySQL
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ───────── STORED UPLOAD MODEL ─────────
+class StoredUpload(db.Model):
+    """Reference-counted, content-addressed file under static/uploads (see utils/upload_store.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    filename = db.Column(db.String(300), nullable=False)  # relative to static/uploads
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime, nullable=True)  # when ref_count last dropped to 0
+
 # ───────── CARD MODEL ─────────
 class Card(db.Model):
+    # Supports the keyset-paginated dashboard listing (utils/card_listing.py)
+    __table_args__ = (
+        db.Index('ix_card_user_created', 'user_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -65,6 +93,9 @@ class Card(db.Model):
 
     views = db.Column(db.Integer, default=0)
 
+    # Bumped on every ORM update; keys the rendered-page cache (utils/page_cache.py)
+    version = db.Column(db.Integer, default=1)
+
     # ───────── PRINTABLE CARD CUSTOMIZATION ─────────
     print_show_phone = db.Column(db.Boolean, default=True)
     print_show_email = db.Column(db.Boolean, default=True)
@@ -76,10 +107,18 @@ class Card(db.Model):
     print_color = db.Column(db.String(20), default='black')
     print_background_color = db.Column(db.String(30), default='matte_black')
     print_layout_json = db.Column(db.Text)
+    # Bumped whenever print_layout_json changes; the designer's base version
+    # for incremental saves (utils/print_layout.py)
+    print_layout_version = db.Column(db.Integer, default=0)
     print_bg_template = db.Column(db.String(100), nullable=True)
-    # ───────── BACKGROUND IMAGE (NEW) ─────────
-    print_bg_image = db.Column(db.LargeBinary)  # Store image binary data
-    print_bg_image_mime = db.Column(db.String(50))  # Store MIME type (image/png, image/jpeg)
+    # ───────── BACKGROUND IMAGE ─────────
+    # Bytes live in BackgroundImage; the card only keeps a reference so card
+    # queries never drag multi-megabyte blobs along.
+    print_bg_image_id = db.Column(db.Integer, db.ForeignKey('background_image.id'), nullable=True)
+    # Legacy inline storage, emptied by utils/migrations.py. Deferred so it is
+    # only loaded if something explicitly touches it.
+    print_bg_image = db.deferred(db.Column(db.LargeBinary))
+    print_bg_image_mime = db.Column(db.String(50))
     
     # ───────── FONT COLORS (NEW) ─────────
     print_font_colors_json = db.Column(db.Text)  # Store font colors as JSON (e.g., {"name": "#ffffff", "phone": "#000000"})
@@ -113,6 +152,16 @@ class Card(db.Model):
     
 # ───────── CARD VIEW MODEL ─────────
 class CardView(db.Model):
+    # One row per (card, viewer) and per (card, anonymous session). The unique
+    # indexes back view de-duplication (NULLs never collide, so each pair only
+    # constrains the rows that actually use it).
+    __table_args__ = (
+        db.Index('ux_card_view_card_viewer', 'card_id', 'viewer_id', unique=True),
+        db.Index('ux_card_view_card_session', 'card_id', 'session_id', unique=True),
+        # Retention compaction (utils/view_analytics.py) deletes by age.
+        db.Index('ix_card_view_viewed_at', 'viewed_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     card_id = db.Column(db.Integer, db.ForeignKey('card.id'), nullable=False)
 
@@ -120,4 +169,49 @@ class CardView(db.Model):
     viewer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     session_id = db.Column(db.String(100), nullable=True)
 
-    viewed_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    viewed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ───────── VIEW ROLLUPS ─────────
+# Pre-aggregated view counts, maintained incrementally by utils/view_recorder.py
+# (see utils/view_analytics.py). "views" counts every page view and
+# "new_visitors" the first view by each visitor, so repeat views are the
+# difference. No FK to card, so rollups never block deleting a card.
+class CardViewHourly(db.Model):
+    __tablename__ = 'card_view_hourly'
+    card_id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)  # start of the hour, UTC
+    views = db.Column(db.Integer, default=0, nullable=False)
+    new_visitors = db.Column(db.Integer, default=0, nullable=False)
+
+
+class CardViewDaily(db.Model):
+    __tablename__ = 'card_view_daily'
+    __table_args__ = (
+        db.Index('ix_card_view_daily_day', 'day'),
+    )
+    card_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # UTC
+    views = db.Column(db.Integer, default=0, nullable=False)
+    new_visitors = db.Column(db.Integer, default=0, nullable=False)
+
+
+# ───────── VISITOR SKETCHES ─────────
+# HyperLogLog sketches (utils/hll.py) of a card's visitors, used instead of
+# one CardView row per visitor when VIEW_COUNTING = "hll"
+# (see utils/visitor_sketches.py).
+class CardVisitorSketch(db.Model):
+    __tablename__ = 'card_visitor_sketch'
+    card_id = db.Column(db.Integer, primary_key=True)
+    registers = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CardVisitorSketchDaily(db.Model):
+    __tablename__ = 'card_visitor_sketch_daily'
+    __table_args__ = (
+        db.Index('ix_card_visitor_sketch_daily_day', 'day'),
+    )
+    card_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # UTC
+    registers = db.Column(db.LargeBinary, nullable=False)
@@ -0,0 +1,69 @@
+"""
+Test setup: the app runs against a throwaway SQLite database, with the
+benchmark suite's local IAM stub (bench/iam_stub) standing in for He5Lib.
+A client logs in by putting a user's google_id in the session as its
+auth_token.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench", "iam_stub"))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp(prefix="cardmaker-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp, "test.db")
+os.environ["PRINT_CACHE_DIR"] = os.path.join(_tmp, "print_cache")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ["VIEW_FLUSH_INTERVAL"] = "0"
+
+from app import app as flask_app  # noqa: E402
+from models import db, User, Card  # noqa: E402
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture
+def app():
+    flask_app.config["TESTING"] = True
+    with flask_app.app_context():
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(role="viewer"):
+        number = next(_ids)
+        user = User(google_id=f"test-user-{number}", name=f"User {number}",
+                    email=f"user{number}@example.com", role=role)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def make_card(app):
+    def make_card(user, **fields):
+        card = Card(user_id=user.id, name=fields.pop("name", "Test Card"), email="card@example.com", **fields)
+        db.session.add(card)
+        db.session.commit()
+        return card
+    return make_card
+
+
+@pytest.fixture
+def client_for(app):
+    """Test client, logged in as ``user`` when one is given."""
+    def client_for(user=None):
+        client = app.test_client()
+        if user is not None:
+            with client.session_transaction() as session:
+                session["auth_token"] = user.google_id
+        return client
+    return client_for
@@ -0,0 +1,55 @@
+import json
+
+from models import db, Card
+
+
+def _select_modern(client, card):
+    response = client.post(f"/card/{card.id}/select_template", json={"template": "modern"})
+    assert response.status_code == 200
+    db.session.expire_all()
+    return json.loads(db.session.get(Card, card.id).print_layout_json)
+
+
+def _patch(client, card, patch, version):
+    return client.post(
+        f"/card/{card.id}/save_layout",
+        data=json.dumps(patch),
+        headers={"Content-Type": "application/merge-patch+json", "If-Match": f'"layout-{version}"'},
+    )
+
+
+def test_drag_after_select_template_keeps_template_background(app, make_user, make_card, client_for):
+    user = make_user("organizer")
+    card = make_card(user)
+    client = client_for(user)
+    layout = _select_modern(client, card)
+    version = db.session.get(Card, card.id).print_layout_version
+    assert layout["bg_template_filename"] == "template_modern.png"
+
+    # What the designer sends for a 10px move of the name element.
+    position = dict(layout["positions"]["name"])
+    position["x"] += 10
+    response = _patch(client, card, {"positions": {"name": position}}, version)
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    saved = db.session.get(Card, card.id)
+    stored = json.loads(saved.print_layout_json)
+    assert saved.print_bg_template == "template_modern.png"
+    assert stored["bg_template_filename"] == "template_modern.png"
+    assert stored["preset"] == layout["preset"]
+    assert stored["positions"]["name"]["x"] == position["x"]
+
+
+def test_patch_removing_template_key_leaves_card_template(app, make_user, make_card, client_for):
+    user = make_user("organizer")
+    card = make_card(user)
+    client = client_for(user)
+    _select_modern(client, card)
+    version = db.session.get(Card, card.id).print_layout_version
+
+    response = _patch(client, card, {"preset": None, "bg_template_filename": None}, version)
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    assert db.session.get(Card, card.id).print_bg_template == "template_modern.png"
@@ -0,0 +1,22 @@
+import io
+
+from models import db, Card
+
+
+def test_invalid_picture_rejects_the_save(app, make_user, make_card, client_for):
+    user = make_user("organizer")
+    card = make_card(user, name="Before")
+    client = client_for(user)
+
+    response = client.post("/save_card", data={
+        "card_id": str(card.id),
+        "name": "After",
+        "profile_pic": (io.BytesIO(b"not an image"), "photo.png"),
+    }, content_type="multipart/form-data")
+
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid image file"}
+    db.session.expire_all()
+    saved = db.session.get(Card, card.id)
+    assert saved.name == "Before"
+    assert saved.profile_pic is None
@@ -0,0 +1,25 @@
+import os
+from datetime import timedelta
+
+from models import db
+from utils import upload_store as upload_store_module
+from utils.upload_store import UploadStore
+
+
+def test_gc_sweeps_files_left_by_rolled_back_requests(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store_module, "schedule_variants", lambda path, kind: None)
+    store = UploadStore(str(tmp_path))
+
+    kept = store.store(b"committed picture", "jpg", "profile")
+    db.session.commit()
+    dropped = store.store(b"rolled back picture", "jpg", "profile")
+    db.session.rollback()
+    assert os.path.exists(store.path_for(dropped))
+
+    # Within the grace period the stray file may still be about to commit.
+    assert store.collect_garbage() == 0
+    assert os.path.exists(store.path_for(dropped))
+
+    assert store.collect_garbage(grace_period=timedelta(seconds=-1)) == 1
+    assert not os.path.exists(store.path_for(dropped))
+    assert os.path.exists(store.path_for(kept))
@@ -0,0 +1,62 @@
+import re
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from models import db
+
+
+USER_SELECT = re.compile(r'^\s*SELECT\b.*\bFROM "?user"?(\s|$)', re.IGNORECASE | re.DOTALL)
+
+
+class UserSelectCounter:
+    """Counts SELECTs on the user table run by the current thread, across all engines."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if USER_SELECT.match(statement):
+            self._local.count = self.count + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+@pytest.fixture
+def user_selects(app):
+    counter = UserSelectCounter()
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", counter)
+
+
+@pytest.mark.parametrize("path, logged_in", [
+    ("/dashboard", True),
+    ("/edit_card/{card_id}", True),
+    ("/card/{card_id}", True),
+    ("/card/{card_id}", False),
+])
+def test_current_user_is_loaded_at_most_once_per_request(
+        app, make_user, make_card, client_for, user_selects, path, logged_in):
+    user = make_user("organizer")
+    card = make_card(user)
+    client = client_for(user if logged_in else None)
+    url = path.format(card_id=card.id)
+
+    # The first request may fill the IAM user cache; each one after it must
+    # still look the user up no more than once.
+    for _ in range(3):
+        db.session.expire_all()
+        user_selects.reset()
+        response = client.get(url)
+        assert response.status_code == 200
+        assert user_selects.count <= 1, f"{url}: {user_selects.count} user SELECTs"
@@ -0,0 +1,18 @@
+def test_vcard_follows_the_request_host(app, make_user, make_card, client_for):
+    card = make_card(make_user())
+    client = client_for()
+    url = f"/card/{card.id}/download"
+
+    first = client.get(url, base_url="http://cards.example.com")
+    second = client.get(url, base_url="http://cards.example.org")
+    assert first.status_code == second.status_code == 200
+    assert f"http://cards.example.com/card/{card.id}" in first.get_data(as_text=True)
+    assert f"http://cards.example.org/card/{card.id}" in second.get_data(as_text=True)
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+    # One host's validator never turns the other host's download into a 304.
+    revalidated = client.get(url, base_url="http://cards.example.org",
+                             headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 200
+    assert client.get(url, base_url="http://cards.example.com",
+                      headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
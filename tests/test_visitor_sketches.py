@@ -0,0 +1,20 @@
+from models import db, Card, CardVisitorSketch
+from utils.hll import HyperLogLog
+from utils.view_recorder import view_recorder
+
+
+def test_views_follow_sketch_estimate_across_single_visitor_flushes(app, make_user, make_card, monkeypatch):
+    monkeypatch.setattr(view_recorder, "counting", "hll")
+    monkeypatch.setattr(view_recorder, "log_rows", False)
+    card = make_card(make_user())
+
+    # VIEW_FLUSH_INTERVAL=0: every visitor is its own flush.
+    for number in range(1000):
+        view_recorder.record(card.id, session_id=f"visitor-{number}")
+
+    db.session.expire_all()
+    views = db.session.get(Card, card.id).views
+    sketch = HyperLogLog.from_bytes(db.session.get(CardVisitorSketch, card.id).registers)
+    estimate = sketch.count()
+    assert views == estimate
+    assert abs(estimate - 1000) <= 1000 * 4 * sketch.standard_error
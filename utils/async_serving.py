@@ -0,0 +1,186 @@
+"""
+ASGI front end for serving the Flask app under uvicorn (see asgi.py).
+
+Under gunicorn's sync workers every request pins a worker for its whole
+lifetime, including time spent waiting on the database. Here the hot,
+read-only public routes are answered on the event loop instead:
+
+- handlers registered with AsyncPublicApp.route run as coroutines; their
+  database and cache lookups go through run_sync, which runs them on a
+  small, bounded thread pool (ASYNC_DB_WORKERS) so the loop keeps
+  accepting requests while a query is in flight
+- work whose result the response does not need (view recording) is handed
+  to the same pool with defer and never awaited
+- a handler returns None whenever it cannot answer on its own (cache miss,
+  logged-in visitor, error case), and the request falls through to the
+  Flask app, which runs on uvicorn's WSGI thread pool (ASYNC_WSGI_WORKERS)
+
+Sessions are read and written through the Flask app's session interface,
+so cookies set here are interchangeable with Flask's own.
+"""
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_WORKERS = 8
+DEFAULT_WSGI_WORKERS = 10
+
+
+class AsyncPublicApp:
+    """ASGI application: async fast paths in front of a Flask (WSGI) app."""
+
+    def __init__(self, flask_app, db_workers=None, wsgi_workers=None):
+        self.flask_app = flask_app
+        config = flask_app.config
+        self.wsgi = WSGIMiddleware(
+            flask_app, workers=wsgi_workers or config.get("ASYNC_WSGI_WORKERS", DEFAULT_WSGI_WORKERS)
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=db_workers or config.get("ASYNC_DB_WORKERS", DEFAULT_DB_WORKERS),
+            thread_name_prefix="async-db",
+        )
+        self.routes = []
+        self.shutdown_callbacks = []
+
+    # ───────── Registration ─────────
+
+    def route(self, pattern):
+        """Register a GET/HEAD fast path for paths fully matching ``pattern``."""
+        regex = re.compile(pattern)
+
+        def decorator(handler):
+            self.routes.append((regex, handler))
+            return handler
+        return decorator
+
+    def on_shutdown(self, callback):
+        """Run ``callback`` (sync, inside an app context) when the server stops."""
+        self.shutdown_callbacks.append(callback)
+        return callback
+
+    # ───────── Helpers for handlers ─────────
+
+    def _in_app_context(self, fn, args, kwargs):
+        with self.flask_app.app_context():
+            return fn(*args, **kwargs)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """Run blocking ``fn`` (database, cache, rendering) off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._in_app_context, fn, args, kwargs)
+
+    def defer(self, fn, *args, **kwargs):
+        """Run ``fn`` on the thread pool without waiting for it."""
+        future = self.executor.submit(self._in_app_context, fn, args, kwargs)
+        future.add_done_callback(_log_failure)
+
+    def open_session(self, request):
+        return self.flask_app.session_interface.open_session(self.flask_app, request)
+
+    def save_session(self, session, response):
+        self.flask_app.session_interface.save_session(self.flask_app, session, response)
+
+    def url_for(self, request, endpoint, **values):
+        """External URL for a Flask endpoint, as url_for would build it for ``request``."""
+        adapter = self.flask_app.create_url_adapter(request)
+        return adapter.build(endpoint, values, force_external=True)
+
+    # ───────── ASGI ─────────
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD") and self.routes:
+            response = await self._fast_path(scope)
+            if response is not None:
+                await self._send(scope, send, response)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def _fast_path(self, scope):
+        path = _path_info(scope)
+        for regex, handler in self.routes:
+            match = regex.fullmatch(path)
+            if match is None:
+                continue
+            request = self.flask_app.request_class(_environ(scope, path))
+            try:
+                return await handler(request, **match.groupdict())
+            except Exception:
+                # Flask answers (and reports) the request instead.
+                logger.exception("Async fast path failed for %s", path)
+                return None
+        return None
+
+    async def _send(self, scope, send, response):
+        # make_conditional turns a response into a 304 without dropping its
+        # data; HTTP forbids a body there (and on HEAD, 204, 1xx).
+        bodiless = response.status_code in (204, 304) or response.status_code < 200
+        body = b"" if bodiless or scope["method"] == "HEAD" else response.get_data()
+        headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in response.headers.items()
+            if not (bodiless and name.lower() == "content-length")
+        ]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for callback in self.shutdown_callbacks:
+                    try:
+                        await self.run_sync(callback)
+                    except Exception:
+                        logger.exception("Shutdown callback %r failed", callback)
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _log_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Deferred task failed", exc_info=exc)
+
+
+def _path_info(scope):
+    path = scope["path"]
+    root_path = scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    return path or "/"
+
+
+def _environ(scope, path):
+    """Minimal WSGI environ (no body) for building a request object."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": path,
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
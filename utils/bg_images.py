@@ -0,0 +1,39 @@
+"""
+Storage helpers for print background images.
+
+Images are content-addressed: uploading the same bytes twice (or for two
+cards) reuses one BackgroundImage row. Rows are removed once no card
+references them any more.
+"""
+import hashlib
+from datetime import datetime
+
+from models import db, Card, BackgroundImage
+from utils.db_utils import insert_ignore
+
+
+def store_background_image(data, mime):
+    """Return the BackgroundImage holding ``data``, creating it if needed (not committed)."""
+    digest = hashlib.sha256(data).hexdigest()
+    image = BackgroundImage.query.filter_by(sha256=digest).first()
+    if image is None:
+        # A concurrent upload of the same bytes may insert the row first; the
+        # insert then does nothing and the locking read below (which, unlike
+        # a plain read, sees rows committed since this transaction began)
+        # picks up that row.
+        db.session.execute(insert_ignore(BackgroundImage), [{
+            'sha256': digest, 'mime': mime, 'size': len(data), 'data': data, 'created_at': datetime.utcnow(),
+        }])
+        image = BackgroundImage.query.filter_by(sha256=digest).with_for_update().one()
+    return image
+
+
+def release_background_image(image_id):
+    """Delete the image if no card references it any more (not committed)."""
+    if image_id is None:
+        return False
+    still_used = db.session.query(Card.id).filter_by(print_bg_image_id=image_id).first()
+    if still_used:
+        return False
+    BackgroundImage.query.filter_by(id=image_id).delete(synchronize_session=False)
+    return True
@@ -0,0 +1,198 @@
+"""
+Streaming bulk export of cards.
+
+Cards are read through a server-side cursor in batches of EXPORT_BATCH_SIZE
+(``yield_per``) and each format is a generator that turns one card at a time
+into output chunks, so memory stays flat whether the export holds ten cards
+or fifty thousand and the first bytes reach the client immediately.
+
+Formats:
+- vcf:   one multi-contact vCard 3.0 file
+- csv:   one row per card
+- jsonl: one JSON object per line
+- zip:   per-card .vcf files plus a QR code PNG for each card
+
+Nothing in the pipeline may issue another query while the cursor is open
+(MySQL cannot run a second statement on a connection that is streaming).
+"""
+import csv
+import io
+import json
+import re
+import zipfile
+
+from sqlalchemy import select
+
+from models import db, Card
+from utils.qr_codes import render_qr
+from utils.vcard import build_vcard
+
+
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    'vcf': 'text/vcard',
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'zip': 'application/zip',
+}
+
+EXPORT_FIELDS = (
+    'id', 'name', 'designation', 'company', 'roles', 'phone', 'email', 'address',
+    'website', 'whatsapp', 'linkedin', 'twitter', 'instagram', 'facebook', 'youtube',
+    'views', 'created_at', 'card_url',
+)
+
+
+def iter_cards(user_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield cards ordered by id, optionally only those owned by ``user_id``.
+
+    Rows are fetched ``batch_size`` at a time from a server-side cursor.
+    """
+    stmt = select(Card).order_by(Card.id)
+    if user_id is not None:
+        stmt = stmt.where(Card.user_id == user_id)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        for card in result.scalars():
+            yield card
+    finally:
+        result.close()
+
+
+def card_record(card, card_url):
+    """Flat, JSON-serializable dict of the exported fields."""
+    roles = card.roles
+    primary = roles[0] if roles else {}
+    return {
+        'id': card.id,
+        'name': card.name,
+        'designation': primary.get('designation') or card.title,
+        'company': primary.get('company') or card.company,
+        'roles': roles,
+        'phone': card.phone,
+        'email': card.email,
+        'address': card.address,
+        'website': card.website,
+        'whatsapp': card.whatsapp,
+        'linkedin': card.linkedin,
+        'twitter': card.twitter,
+        'instagram': card.instagram,
+        'facebook': card.facebook,
+        'youtube': card.youtube,
+        'views': card.views or 0,
+        'created_at': card.created_at.isoformat() if card.created_at else None,
+        'card_url': card_url,
+    }
+
+
+# ───────── Formats ─────────
+
+def _export_vcf(cards, card_url_for, photo_for):
+    for card in cards:
+        yield build_vcard(
+            card,
+            photo=photo_for(card) if photo_for else None,
+            card_url=card_url_for(card.id),
+        ).encode('utf-8')
+
+
+def _export_csv(cards, card_url_for, photo_for):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    # BOM so spreadsheet apps pick UTF-8 for names with accents.
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_FIELDS)
+    yield drain()
+    for card in cards:
+        record = card_record(card, card_url_for(card.id))
+        record['roles'] = '; '.join(
+            ' — '.join(part for part in (role.get('designation'), role.get('company')) if part)
+            for role in record['roles']
+        )
+        writer.writerow(['' if record[field] is None else record[field] for field in EXPORT_FIELDS])
+        yield drain()
+
+
+def _export_jsonl(cards, card_url_for, photo_for):
+    for card in cards:
+        record = card_record(card, card_url_for(card.id))
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class _ZipStream:
+    """Write-only file object for ZipFile that hands out what was written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '-', value or '').strip('-').lower()[:40] or 'card'
+
+
+def _export_zip(cards, card_url_for, photo_for):
+    # ZipFile falls back to data descriptors on an unseekable stream, so each
+    # entry is emitted as soon as it has been written.
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        for card in cards:
+            card_url = card_url_for(card.id)
+            name = f"{card.id}-{_slug(card.name)}"
+            vcard = build_vcard(card, photo=photo_for(card) if photo_for else None, card_url=card_url)
+            archive.writestr(f"vcards/{name}.vcf", vcard.encode('utf-8'), compress_type=zipfile.ZIP_DEFLATED)
+            # Bypass the QR LRU: a bulk export would only evict the hot entries.
+            qr_png, _ = render_qr.__wrapped__(card_url)
+            archive.writestr(f"qr/{name}.png", qr_png, compress_type=zipfile.ZIP_STORED)
+            yield stream.drain()
+    yield stream.drain()
+
+
+_EXPORTERS = {
+    'vcf': _export_vcf,
+    'csv': _export_csv,
+    'jsonl': _export_jsonl,
+    'zip': _export_zip,
+}
+
+
+def export_cards(fmt, card_url_for, user_id=None, photo_for=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Stream an export of every card (or every card of ``user_id``).
+
+    Args:
+        fmt: one of EXPORT_FORMATS
+        card_url_for: callable(card_id) -> public card URL
+        user_id: restrict the export to this owner, or None for all cards
+        photo_for: optional callable(card) -> JPEG bytes to embed in vCards
+        batch_size: rows fetched per round trip
+
+    Yields:
+        bytes: output chunks
+    """
+    if fmt not in _EXPORTERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    cards = iter_cards(user_id, batch_size)
+    for chunk in _EXPORTERS[fmt](cards, card_url_for, photo_for):
+        if chunk:
+            yield chunk
@@ -0,0 +1,257 @@
+"""
+Bulk card import from CSV or JSONL.
+
+Rows are parsed and validated one at a time as the file is read, and valid
+rows are inserted with one multi-row INSERT and one commit per batch
+(IMPORT_BATCH_SIZE) instead of a commit per card. If a batch fails as a
+whole, it is rolled back and retried row by row so the bad row can be
+reported and the rest still go in.
+
+Accepted columns are the Card fields in IMPORT_FIELDS. Multi-role cards
+use ``roles`` (or ``roles_json``): a JSON list of
+{designation, company, bio} objects, given as a JSON string in CSV.
+"""
+import csv
+import io
+import json
+import re
+from collections import namedtuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Card
+from utils.print_layout import layout_json
+
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+# Field -> maximum length (None for TEXT columns).
+IMPORT_FIELDS = {
+    'card_label': 80,
+    'name': 100,
+    'title': 100,
+    'designation': None,
+    'company': 150,
+    'bio': None,
+    'phone': 20,
+    'email': 150,
+    'address': 200,
+    'website': 200,
+    'upi': 100,
+    'pic_shape': 10,
+    'pic_position': 10,
+    'identity_align': 10,
+    'theme': 30,
+    'instagram': 300,
+    'linkedin': 300,
+    'twitter': 300,
+    'facebook': 300,
+    'youtube': 300,
+    'whatsapp': 50,
+}
+
+CHOICE_FIELDS = {
+    'pic_shape': ('round', 'square'),
+    'pic_position': ('left', 'center', 'right'),
+    'identity_align': ('left', 'center', 'right'),
+}
+
+ROLE_KEYS = ('designation', 'company', 'bio')
+MAX_ROLES = 10
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+ImportResult = namedtuple('ImportResult', ['created', 'failed', 'errors'])
+
+
+class ImportRowError(ValueError):
+    """Raised for a row that cannot be imported."""
+
+
+# ───────── Parsing ─────────
+
+def iter_csv_rows(stream):
+    """Yield (line number, dict) for each CSV record of a text stream."""
+    reader = csv.DictReader(stream)
+    for record in reader:
+        if None in record:
+            # More cells than header columns
+            yield reader.line_num, ImportRowError("Too many columns")
+            continue
+        yield reader.line_num, record
+
+
+def iter_jsonl_rows(stream):
+    """Yield (line number, dict) for each non-blank JSONL line of a text stream."""
+    for line_num, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_num, ImportRowError(f"Invalid JSON: {exc}")
+            continue
+        if not isinstance(record, dict):
+            yield line_num, ImportRowError("Each line must be a JSON object")
+            continue
+        yield line_num, record
+
+
+def open_text(binary_stream):
+    """Decode an uploaded byte stream as UTF-8 (a BOM is accepted)."""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+
+# ───────── Validation ─────────
+
+def _clean_roles(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ImportRowError("roles must be a JSON list")
+    if not isinstance(value, list) or len(value) > MAX_ROLES:
+        raise ImportRowError(f"roles must be a list of at most {MAX_ROLES} objects")
+    roles = []
+    for role in value:
+        if not isinstance(role, dict):
+            raise ImportRowError("Each role must be an object")
+        roles.append({key: str(role.get(key) or '').strip() for key in ROLE_KEYS})
+    return roles
+
+
+def validate_row(record):
+    """
+    Turn one input record into Card column values.
+
+    Raises:
+        ImportRowError: if the record is not importable
+    """
+    values = {}
+    for field, max_length in IMPORT_FIELDS.items():
+        value = record.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, (str, int, float)):
+            raise ImportRowError(f"{field} must be text")
+        value = str(value).strip()
+        if not value:
+            continue
+        if max_length and len(value) > max_length:
+            raise ImportRowError(f"{field} is longer than {max_length} characters")
+        if field in CHOICE_FIELDS and value not in CHOICE_FIELDS[field]:
+            raise ImportRowError(f"{field} must be one of {', '.join(CHOICE_FIELDS[field])}")
+        values[field] = value
+
+    if not values.get('name'):
+        raise ImportRowError("name is required")
+    if 'email' in values and not EMAIL_RE.match(values['email']):
+        raise ImportRowError("email is not a valid address")
+
+    roles = _clean_roles(record.get('roles') or record.get('roles_json'))
+    if roles:
+        values['roles_json'] = json.dumps(roles, separators=(',', ':'))
+        # Keep the legacy single-role columns in step with the first role.
+        primary = roles[0]
+        values.setdefault('designation', primary['designation'] or None)
+        values.setdefault('company', primary['company'] or None)
+        values.setdefault('bio', primary['bio'] or None)
+    return values
+
+
+# ───────── Import ─────────
+
+def _row_template():
+    # A multi-row INSERT needs the same keys in every row, so absent fields
+    # take the column default (or NULL) explicitly.
+    template = {}
+    for field in list(IMPORT_FIELDS) + ['roles_json']:
+        default = Card.__table__.c[field].default
+        template[field] = default.arg if default is not None and default.is_scalar else None
+    return template
+
+
+def _insert(rows):
+    db.session.execute(Card.__table__.insert(), rows)
+
+
+def _flush_batch(batch, errors, counts):
+    """Insert ``batch`` of (line, values); on failure retry row by row."""
+    if not batch:
+        return
+    try:
+        _insert([values for _, values in batch])
+        db.session.commit()
+        counts['created'] += len(batch)
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+
+    for line_num, values in batch:
+        try:
+            _insert([values])
+            db.session.commit()
+            counts['created'] += 1
+        except SQLAlchemyError as exc:
+            db.session.rollback()
+            counts['failed'] += 1
+            _report(errors, line_num, f"Database error: {exc.__class__.__name__}")
+
+
+def _report(errors, line_num, message):
+    if len(errors) < MAX_REPORTED_ERRORS:
+        errors.append({'row': line_num, 'error': message})
+
+
+def import_cards(rows, user_id, layout=None, bg_template=None, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Validate and insert cards from ``rows`` for ``user_id``.
+
+    Args:
+        rows: iterable of (line number, record dict or ImportRowError)
+        user_id: owner of the imported cards
+        layout: optional print layout (dict) applied to every card
+        bg_template: optional print background template filename
+        batch_size: rows per INSERT / commit
+        dry_run: validate only, insert nothing
+
+    Returns:
+        ImportResult: (created, failed, errors) — errors holds at most
+        MAX_REPORTED_ERRORS entries of {'row', 'error'}
+    """
+    shared = {'user_id': user_id}
+    if layout is not None:
+        shared['print_layout_json'] = layout_json(layout)
+        shared['print_bg_template'] = bg_template
+
+    template = _row_template()
+    counts = {'created': 0, 'failed': 0}
+    errors = []
+    batch = []
+    for line_num, record in rows:
+        try:
+            if isinstance(record, ImportRowError):
+                raise record
+            values = validate_row(record)
+        except ImportRowError as exc:
+            counts['failed'] += 1
+            _report(errors, line_num, str(exc))
+            continue
+
+        if dry_run:
+            counts['created'] += 1
+            continue
+        batch.append((line_num, dict(template, **values, **shared)))
+        if len(batch) >= batch_size:
+            _flush_batch(batch, errors, counts)
+            batch = []
+    if not dry_run:
+        _flush_batch(batch, errors, counts)
+    return ImportResult(counts['created'], counts['failed'], errors)
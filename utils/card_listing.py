@@ -0,0 +1,82 @@
+"""
+Keyset-paginated card listings for the dashboard.
+
+Pages are ordered newest first on (created_at, id) and continue from an
+opaque cursor instead of an OFFSET, so every page is a bounded index range
+scan on ix_card_user_created no matter how many cards an account owns. Only
+the columns the listing renders are selected.
+
+Rows with a NULL created_at (inserted without the model default) sort
+last, since MySQL and SQLite order NULL below every value; the cursor and
+the keyset predicate carry that NULL band explicitly.
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models import db, Card
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Everything dashboard.html (and the JSON variant) shows for a card.
+LISTING_COLUMNS = (
+    Card.id,
+    Card.name,
+    Card.designation,
+    Card.title,
+    Card.views,
+    Card.created_at,
+)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(created_at, card_id):
+    # An empty timestamp stands for NULL.
+    raw = f"{created_at.isoformat() if created_at else ''}|{card_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, card_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return (datetime.fromisoformat(created_at) if created_at else None), int(card_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursorError(cursor) from exc
+
+
+def list_user_cards(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of a user's cards as lightweight rows.
+
+    Returns:
+        tuple: (rows, next_cursor) — next_cursor is None on the last page
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = db.session.query(*LISTING_COLUMNS).filter(Card.user_id == user_id)
+
+    if cursor:
+        created_at, card_id = decode_cursor(cursor)
+        if created_at is None:
+            query = query.filter(Card.created_at.is_(None), Card.id < card_id)
+        else:
+            query = query.filter(or_(
+                Card.created_at < created_at,
+                and_(Card.created_at == created_at, Card.id < card_id),
+                Card.created_at.is_(None),
+            ))
+
+    rows = query.order_by(Card.created_at.desc(), Card.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
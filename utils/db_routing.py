@@ -0,0 +1,98 @@
+"""
+Read-replica routing for db.session (DATABASE_REPLICA_URL).
+
+When a "replica" bind is configured, views decorated with read_replica (and
+blocks wrapped in replica_reads) send their plain SELECTs to it. Everything
+else goes to the primary:
+
+- flushes, INSERT / UPDATE / DELETE and SELECT ... FOR UPDATE
+- every statement after the first write in the same request, so a view that
+  writes (inline view counting) reads its own writes
+- all requests of a visitor who wrote within REPLICA_STICKY_SECONDS: a
+  request that writes outside a read-replica view stamps the session, and
+  read_replica skips the replica while the stamp is fresh, so a user never
+  sees their own save undone by replication lag
+
+Without a replica bind nothing changes: every statement uses the primary.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, UpdateBase
+
+
+REPLICA_BIND = "replica"
+SESSION_KEY = "db_write_at"
+
+
+class RoutingSession(Session):
+    """db.session class that can send reads to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or isinstance(clause, UpdateBase) or _locks_rows(clause):
+                g._db_wrote = True
+                if not g.get("_db_replica"):
+                    g._db_wrote_outside_replica = True
+            elif g.get("_db_replica") and not g.get("_db_wrote") and isinstance(clause, Select):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _locks_rows(clause):
+    return isinstance(clause, Select) and clause._for_update_arg is not None
+
+
+@contextmanager
+def replica_reads():
+    """Send the block's plain SELECTs to the replica (requires an app context)."""
+    previous = g.get("_db_replica", False)
+    g._db_replica = True
+    try:
+        yield
+    finally:
+        g._db_replica = previous
+
+
+def wrote_recently(session_data):
+    """True while a visitor's last write may not have reached the replica."""
+    written_at = session_data.get(SESSION_KEY)
+    if written_at is None:
+        return False
+    return time.time() - written_at < current_app.config.get("REPLICA_STICKY_SECONDS", 0)
+
+
+def read_replica(f):
+    """
+    Serve a read-only view's queries from the replica.
+
+    Place it below the login decorators, so identity lookups (which may
+    create the User row) stay on the primary.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if wrote_recently(session):
+            return f(*args, **kwargs)
+        with replica_reads():
+            return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def init_app(app):
+    """Stamp the session of visitors whose request wrote to the primary."""
+    if REPLICA_BIND not in app.config.get("SQLALCHEMY_BINDS", {}):
+        return
+
+    @app.after_request
+    def _stamp_writes(response):
+        # Writes made while serving a read-replica view (view counting) are
+        # bookkeeping, not the visitor's own data.
+        if g.get("_db_wrote_outside_replica"):
+            session[SESSION_KEY] = time.time()
+        return response
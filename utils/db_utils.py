@@ -1,5 +1,43 @@
+from sqlalchemy import insert
+
 from models import db
 
 
 def get_db():
-    return db.session
\ No newline at end of file
+    return db.session
+
+
+def insert_ignore(model):
+    """
+    Build an INSERT that silently skips rows hitting a unique constraint.
+
+    Renders as ``INSERT IGNORE`` on MySQL and ``INSERT OR IGNORE`` on SQLite,
+    so de-duplication happens in the same statement as the write.
+    """
+    return (
+        insert(model.__table__)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+
+def insert_or_increment(model, rows, counters):
+    """
+    Build a multi-row upsert that adds ``counters`` onto existing rows.
+
+    New primary keys are inserted as given; for keys that already exist each
+    counter column is incremented by the supplied value
+    (``ON DUPLICATE KEY UPDATE`` on MySQL, ``ON CONFLICT DO UPDATE`` on SQLite).
+    """
+    table = model.__table__
+    if db.engine.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in counters})
+
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    stmt = sqlite_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key.columns],
+        set_={name: table.c[name] + stmt.excluded[name] for name in counters},
+    )
@@ -0,0 +1,225 @@
+"""
+Image processing for uploaded card pictures.
+
+Every upload goes through the same steps before it is stored:
+- validate that the bytes really are a supported image (and not a
+  decompression bomb)
+- apply the EXIF orientation, then drop EXIF/GPS and other metadata
+- downscale to the largest size the app can ever display
+
+Responsive WebP variants for profile and banner pictures are produced in a
+background thread pool, so the upload request only pays for the first,
+cheap normalization pass. Templates pick the variants up through
+``srcset`` once they exist on disk.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+# Refuse anything larger than ~50 megapixels outright.
+MAX_PIXELS = 50_000_000
+
+# Largest stored size per kind, and the widths of the WebP variants rendered
+# from it. Profile pictures are shown at 108px, banners at up to 420px wide
+# (1x/2x/3x densities).
+IMAGE_KINDS = {
+    'profile': {'max_edge': 512, 'widths': (120, 240, 360)},
+    'banner': {'max_edge': 1600, 'widths': (480, 840, 1260)},
+}
+
+# Print backgrounds cover a 3.5" x 2" card at 300 DPI.
+PRINT_SIZE = (1050, 600)
+PRINT_DPI = (300, 300)
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+IMAGE_WORKERS = 2
+
+
+class InvalidImageError(ValueError):
+    """Raised when uploaded bytes are not a usable image."""
+
+
+# ───────── Decoding ─────────
+
+def load_image(data, draft_size=None):
+    """Decode and validate ``data``; returns an upright PIL image."""
+    try:
+        probe = Image.open(io.BytesIO(data))
+        if probe.format not in SUPPORTED_FORMATS:
+            raise InvalidImageError(f"Unsupported image format: {probe.format}")
+        if probe.width * probe.height > MAX_PIXELS:
+            raise InvalidImageError("Image is too large")
+        probe.verify()
+
+        # verify() leaves the image unusable, so decode again for real.
+        image = Image.open(io.BytesIO(data))
+        if draft_size and image.format == 'JPEG':
+            # Let libjpeg decode at a reduced scale (much faster for photos).
+            image.draft('RGB', draft_size)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+        return image
+    except InvalidImageError:
+        raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError) as exc:
+        raise InvalidImageError(str(exc)) from exc
+
+
+def _is_animated(data):
+    with Image.open(io.BytesIO(data)) as image:
+        return getattr(image, 'is_animated', False)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _encode(image, fmt, icc_profile=None, **options):
+    # Only the pixel data (plus the colour profile) is written out; EXIF,
+    # XMP and text chunks from the source are dropped.
+    buffer = io.BytesIO()
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def _encode_for_storage(image, icc_profile, **options):
+    """Encode as PNG when the image needs transparency, JPEG otherwise."""
+    if image.mode == 'CMYK':
+        # A CMYK profile does not describe the converted RGB pixels.
+        icc_profile = None
+    if _has_alpha(image):
+        image = image.convert('RGBA')
+        return _encode(image, 'PNG', icc_profile, optimize=True, **options), 'png', 'image/png'
+    image = image.convert('RGB')
+    return (
+        _encode(image, 'JPEG', icc_profile, quality=JPEG_QUALITY, optimize=True, progressive=True, **options),
+        'jpg',
+        'image/jpeg',
+    )
+
+
+# ───────── Profile / banner uploads ─────────
+
+def normalize_upload(data, kind):
+    """
+    Validate, orient, strip and downscale an uploaded profile/banner picture.
+
+    Animated GIFs are kept byte-for-byte (after validation) so they stay
+    animated.
+
+    Returns:
+        tuple: (bytes, file extension without dot)
+    """
+    max_edge = IMAGE_KINDS[kind]['max_edge']
+    image = load_image(data, draft_size=(max_edge, max_edge))
+
+    if _is_animated(data):
+        return data, 'gif'
+
+    icc_profile = image.info.get('icc_profile')
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    body, ext, _ = _encode_for_storage(image, icc_profile)
+    return body, ext
+
+
+def variant_filename(filename, width):
+    """Name of the ``width`` px WebP variant stored next to ``filename``."""
+    stem = filename.rsplit('.', 1)[0]
+    return f"{stem}.{width}w.webp"
+
+
+def remove_variants(path, kind):
+    """Delete any variants previously generated for ``path``."""
+    directory, filename = os.path.split(path)
+    for width in IMAGE_KINDS[kind]['widths']:
+        try:
+            os.remove(os.path.join(directory, variant_filename(filename, width)))
+        except FileNotFoundError:
+            pass
+
+
+def generate_variants(path, kind):
+    """Write the WebP variants for the stored image at ``path``."""
+    directory, filename = os.path.split(path)
+    with Image.open(path) as source:
+        if getattr(source, 'is_animated', False):
+            return
+        source.load()
+        icc_profile = source.info.get('icc_profile')
+        for width in IMAGE_KINDS[kind]['widths']:
+            target = os.path.join(directory, variant_filename(filename, width))
+            if os.path.exists(target):
+                continue
+            image = source.copy()
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+            body = _encode(image, 'WEBP', icc_profile, quality=WEBP_QUALITY, method=4)
+            # Write-then-rename so a half-written variant is never served.
+            tmp_path = f"{target}.tmp"
+            with open(tmp_path, 'wb') as fh:
+                fh.write(body)
+            os.replace(tmp_path, target)
+
+
+# ───────── Print backgrounds ─────────
+
+def prepare_print_background(data):
+    """
+    Validate, orient and strip a print background, scaled down (never up) so
+    it still covers the card at print resolution.
+
+    Returns:
+        tuple: (bytes, mime type)
+    """
+    image = load_image(data, draft_size=PRINT_SIZE)
+    icc_profile = image.info.get('icc_profile')
+
+    scale = max(PRINT_SIZE[0] / image.width, PRINT_SIZE[1] / image.height)
+    if scale < 1:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+
+    body, _, mime = _encode_for_storage(image, icc_profile, dpi=PRINT_DPI)
+    return body, mime
+
+
+# ───────── Worker pool ─────────
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # One pool per process; recreated after a fork (gunicorn workers).
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image-variants')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _generate_variants_logged(path, kind):
+    try:
+        generate_variants(path, kind)
+    except Exception:
+        logger.exception("Failed to build image variants for %s", path)
+
+
+def schedule_variants(path, kind):
+    """Queue variant generation for ``path`` on the background pool."""
+    return _get_executor().submit(_generate_variants_logged, path, kind)
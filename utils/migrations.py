@@ -0,0 +1,128 @@
+"""
+Idempotent schema upgrades applied at startup.
+
+``db.create_all()`` only creates missing tables; it never touches tables that
+already exist. Each step here checks the live schema first and is safe to run
+on every boot, on both MySQL and SQLite.
+"""
+from flask import current_app
+from sqlalchemy import inspect, text
+
+from models import db, Card, CardView
+from utils.bg_images import store_background_image
+from utils.view_analytics import backfill_rollups
+from utils.visitor_sketches import seed_sketches
+
+
+def _index_names(inspector, table_name):
+    return {index["name"] for index in inspector.get_indexes(table_name)}
+
+
+def _column_names(inspector, table_name):
+    return {column["name"] for column in inspector.get_columns(table_name)}
+
+
+def _add_column(table_name, column):
+    """ALTER TABLE ... ADD COLUMN for a model column (type only, nullable)."""
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    db.session.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+    db.session.commit()
+
+
+def _dedupe_card_views(column):
+    """Keep the oldest CardView row per (card_id, <column>) pair."""
+    # The extra derived table lets MySQL delete from the table it selects from.
+    db.session.execute(text(
+        f"DELETE FROM card_view WHERE {column} IS NOT NULL AND id NOT IN ("
+        f" SELECT keep_id FROM ("
+        f"  SELECT MIN(id) AS keep_id FROM card_view"
+        f"  WHERE {column} IS NOT NULL GROUP BY card_id, {column}"
+        f" ) AS keep_rows"
+        f")"
+    ))
+    db.session.commit()
+
+
+def ensure_card_view_indexes():
+    """Add the unique (card_id, viewer_id) / (card_id, session_id) indexes and the viewed_at index."""
+    inspector = inspect(db.engine)
+    existing = _index_names(inspector, CardView.__tablename__)
+
+    for index in CardView.__table__.indexes:
+        if index.name in existing:
+            continue
+        if index.unique:
+            column = [col.name for col in index.columns if col.name != "card_id"][0]
+            _dedupe_card_views(column)
+        index.create(bind=db.engine)
+
+
+def ensure_card_version_column():
+    """Add Card.version to databases created before the page cache existed."""
+    inspector = inspect(db.engine)
+    if "version" not in _column_names(inspector, Card.__tablename__):
+        _add_column(Card.__tablename__, Card.__table__.c.version)
+
+
+def ensure_card_layout_version_column():
+    """Add Card.print_layout_version to databases created before incremental saves."""
+    inspector = inspect(db.engine)
+    if "print_layout_version" not in _column_names(inspector, Card.__tablename__):
+        _add_column(Card.__tablename__, Card.__table__.c.print_layout_version)
+        db.session.execute(text(f"UPDATE {Card.__tablename__} SET print_layout_version = 0"))
+        db.session.commit()
+
+
+def ensure_card_indexes():
+    """Add Card's listing index to databases created before it existed."""
+    inspector = inspect(db.engine)
+    existing = _index_names(inspector, Card.__tablename__)
+    for index in Card.__table__.indexes:
+        if index.name not in existing:
+            index.create(bind=db.engine)
+
+
+def move_background_images_out_of_card():
+    """Copy inline Card.print_bg_image blobs into BackgroundImage rows."""
+    inspector = inspect(db.engine)
+    if "print_bg_image_id" not in _column_names(inspector, Card.__tablename__):
+        _add_column(Card.__tablename__, Card.__table__.c.print_bg_image_id)
+
+    # Fetch ids first and move one blob at a time to keep memory flat.
+    card_ids = [
+        row[0] for row in db.session.execute(
+            text("SELECT id FROM card WHERE print_bg_image IS NOT NULL")
+        )
+    ]
+    for card_id in card_ids:
+        data, mime = db.session.execute(
+            text("SELECT print_bg_image, print_bg_image_mime FROM card WHERE id = :id"),
+            {"id": card_id},
+        ).one()
+        image = store_background_image(data, mime or "image/png")
+        db.session.execute(
+            text("UPDATE card SET print_bg_image_id = :image_id, print_bg_image = NULL WHERE id = :id"),
+            {"image_id": image.id, "id": card_id},
+        )
+        db.session.commit()
+
+
+def ensure_view_rollups():
+    """Fill the view rollup tables from CardView the first time they exist."""
+    backfill_rollups()
+
+
+def ensure_visitor_sketches():
+    """Seed unique-visitor sketches from CardView when switching to "hll" counting."""
+    if current_app.config.get("VIEW_COUNTING") == "hll":
+        seed_sketches()
+
+
+def run_migrations():
+    ensure_card_view_indexes()
+    move_background_images_out_of_card()
+    ensure_card_indexes()
+    ensure_card_version_column()
+    ensure_card_layout_version_column()
+    ensure_view_rollups()
+    ensure_visitor_sketches()
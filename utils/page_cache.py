@@ -0,0 +1,170 @@
+"""
+Rendered-HTML cache for public card pages.
+
+card.html only changes when the card row changes, so view_card renders it
+once per card version and serves the stored HTML afterwards. Each entry is
+stored with the Card.version it was rendered from; a lookup with any other
+version is a miss, so a stale page is never served even by a worker that
+did not see the write.
+
+Card.version is bumped automatically on every ORM update of a Card, and
+entries for updated or deleted cards are dropped after the commit, which
+covers every mutating route without per-route bookkeeping.
+
+Backends (PAGE_CACHE_BACKEND):
+- "memory": per-process LRU with TTL (default)
+- "filesystem": one file per card under PAGE_CACHE_DIR, shared by all
+  gunicorn workers on the host; files older than PAGE_CACHE_TTL are misses
+- "none": caching disabled
+"""
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import Card
+from utils.ttl_cache import TTLCache
+
+
+class NullPageCache:
+    def get(self, card_id, version):
+        return None
+
+    def set(self, card_id, version, html):
+        pass
+
+    def invalidate(self, card_id):
+        pass
+
+
+class MemoryPageCache:
+    """In-process LRU of card_id -> (version, html)."""
+
+    def __init__(self, maxsize=512, ttl=3600):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, card_id, version):
+        entry = self._entries.get(card_id)
+        if entry and entry[0] == version:
+            return entry[1]
+        return None
+
+    def set(self, card_id, version, html):
+        self._entries.set(card_id, (version, html))
+
+    def invalidate(self, card_id):
+        self._entries.pop(card_id)
+
+
+class FilePageCache:
+    """One ``<card_id>.html`` file per card; the first line holds the version."""
+
+    def __init__(self, directory, ttl=3600):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, card_id):
+        return os.path.join(self.directory, f"{int(card_id)}.html")
+
+    def get(self, card_id, version):
+        try:
+            with open(self._path(card_id), encoding='utf-8') as fh:
+                # Expire like the memory backend, so pages pick up image
+                # variants and template changes that do not bump the version.
+                if self.ttl and os.fstat(fh.fileno()).st_mtime + self.ttl < time.time():
+                    return None
+                if fh.readline().rstrip('\n') != str(version):
+                    return None
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, card_id, version, html):
+        path = self._path(card_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            fh.write(f"{version}\n")
+            fh.write(html)
+        os.replace(tmp_path, path)
+
+    def invalidate(self, card_id):
+        try:
+            os.remove(self._path(card_id))
+        except FileNotFoundError:
+            pass
+
+
+class PageCache:
+    """Facade configured from app.config; delegates to the selected backend."""
+
+    def __init__(self, app=None):
+        self.backend = NullPageCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('PAGE_CACHE_BACKEND', 'memory')
+        if kind == 'memory':
+            self.backend = MemoryPageCache(
+                maxsize=app.config.get('PAGE_CACHE_SIZE', 512),
+                ttl=app.config.get('PAGE_CACHE_TTL', 3600),
+            )
+        elif kind == 'filesystem':
+            directory = app.config.get('PAGE_CACHE_DIR') or os.path.join(app.instance_path, 'page_cache')
+            self.backend = FilePageCache(directory, ttl=app.config.get('PAGE_CACHE_TTL', 3600))
+        elif kind == 'none':
+            self.backend = NullPageCache()
+        else:
+            raise RuntimeError(f"Unknown PAGE_CACHE_BACKEND: {kind}")
+        app.extensions['page_cache'] = self
+
+    def get(self, card_id, version):
+        return self.backend.get(card_id, version or 0)
+
+    def set(self, card_id, version, html):
+        self.backend.set(card_id, version or 0, html)
+
+    def invalidate(self, card_id):
+        self.backend.invalidate(card_id)
+
+
+page_cache = PageCache()
+
+
+# ───────── Versioning & invalidation ─────────
+
+def _touched_cards(session):
+    return session.info.setdefault('page_cache_touched_cards', set())
+
+
+@event.listens_for(Card, 'before_update')
+def _bump_card_version(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and not session.is_modified(target, include_collections=False):
+        return
+    target.version = (target.version or 0) + 1
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_cards(session, flush_context):
+    touched = _touched_cards(session)
+    for obj in session.dirty:
+        if isinstance(obj, Card) and obj.id is not None:
+            touched.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Card) and obj.id is not None:
+            touched.add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_touched_cards(session):
+    touched = session.info.pop('page_cache_touched_cards', None)
+    for card_id in touched or ():
+        page_cache.invalidate(card_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_touched_cards(session):
+    session.info.pop('page_cache_touched_cards', None)
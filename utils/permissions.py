@@ -50,7 +50,11 @@ PERMISSIONS = {
     "cards.delete": [ROLE_ADMIN, ROLE_ORGANIZER],
     "cards.design": [ROLE_ADMIN, ROLE_ORGANIZER],
     "cards.print": [ROLE_VIEWER, ROLE_ADMIN, ROLE_ORGANIZER],
+    # Bulk export of every card; everyone else exports only their own.
+    "cards.export": [ROLE_ADMIN, ROLE_ORGANIZER],
     "templates.manage": [ROLE_ADMIN, ROLE_ORGANIZER],
+    # View analytics across every card; everyone sees their own cards.
+    "analytics.view_all": [ROLE_ADMIN, ROLE_ORGANIZER],
     "settings.view": [ROLE_ORGANIZER],
     "settings.edit": [ROLE_ORGANIZER],
 }
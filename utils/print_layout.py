@@ -0,0 +1,171 @@
+"""
+Validation and canonical storage of print layouts (Card.print_layout_json).
+
+The designer posts a layout document: element positions and sizes, font
+colours, background / accent names, show_* toggles and a custom text line.
+save_layout used to store whatever JSON arrived, and every designer, print
+and render request then re-parsed it. Layouts now go through
+normalize_layout before they are stored:
+
+- the JSON schema below is compiled once, at import, with fastjsonschema
+- numbers are rounded and colours lower-cased, so equal layouts store equal
+  bytes
+- the result is serialized compactly with sorted keys (layout_json)
+
+Request bodies are capped at MAX_LAYOUT_BYTES before they are parsed.
+
+The designer saves incrementally: it sends a JSON merge patch (RFC 7396)
+against the layout version it last saw (Card.print_layout_version, as an
+ETag in If-Match), and save_layout applies it with merge_patch. The version
+is bumped by every change to print_layout_json, whichever route makes it.
+"""
+import json
+
+import fastjsonschema
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+
+from models import Card
+
+
+MAX_LAYOUT_BYTES = 16 * 1024
+LAYOUT_PATCH_MIMETYPE = 'application/merge-patch+json'
+MAX_CUSTOM_TEXT = 200
+
+LAYOUT_ELEMENTS = (
+    'name', 'designation', 'company', 'phone', 'email',
+    'website', 'address', 'qr', 'custom_text',
+)
+BACKGROUNDS = ('matte_black', 'matte_navy', 'matte_forest', 'matte_maroon', 'matte_slate', 'matte_beige')
+ACCENTS = ('orange', 'blue', 'green', 'purple', 'red', 'gold')
+
+# Card canvas is 630 x 360 px; allow elements to be dragged partly off it.
+_COORDINATE = {'type': 'number', 'minimum': -630, 'maximum': 1260}
+
+
+def _per_element(schema):
+    """Object keyed by layout element names, every value matching ``schema``."""
+    return {
+        'type': 'object',
+        'additionalProperties': False,
+        'properties': {name: schema for name in LAYOUT_ELEMENTS},
+    }
+
+
+LAYOUT_SCHEMA = {
+    'type': 'object',
+    'additionalProperties': False,
+    'properties': {
+        'positions': _per_element({
+            'type': 'object',
+            'additionalProperties': False,
+            'properties': {
+                'x': _COORDINATE,
+                'y': _COORDINATE,
+                'scale': {'type': 'number', 'minimum': 0.1, 'maximum': 5},
+            },
+        }),
+        'sizes': _per_element({'type': 'number', 'minimum': 1, 'maximum': 400}),
+        'font_colors': _per_element({'type': 'string', 'pattern': '^#([0-9a-fA-F]{3}|[0-9a-fA-F]{6})$'}),
+        'background': {'enum': list(BACKGROUNDS)},
+        'accent': {'enum': list(ACCENTS)},
+        'preset': {'type': 'string', 'maxLength': 30},
+        'bg_template_filename': {
+            'type': ['string', 'null'],
+            'maxLength': 100,
+            'pattern': '^[A-Za-z0-9._-]*$',
+        },
+        'show_phone': {'type': 'boolean'},
+        'show_email': {'type': 'boolean'},
+        'show_website': {'type': 'boolean'},
+        'show_address': {'type': 'boolean'},
+        'custom_text': {'type': 'string', 'maxLength': MAX_CUSTOM_TEXT},
+    },
+}
+
+_validate = fastjsonschema.compile(LAYOUT_SCHEMA)
+
+
+class InvalidLayoutError(ValueError):
+    """Raised when a layout document does not match LAYOUT_SCHEMA."""
+
+
+def _number(value, digits):
+    value = round(float(value), digits)
+    return int(value) if value.is_integer() else value
+
+
+def normalize_layout(data):
+    """
+    Validate a layout document and return its canonical form.
+
+    Raises:
+        InvalidLayoutError: if ``data`` does not match LAYOUT_SCHEMA
+    """
+    try:
+        _validate(data)
+    except fastjsonschema.JsonSchemaValueException as exc:
+        # Messages name the offending path as "data.<field>"
+        message = exc.message
+        message = message[5:] if message.startswith('data.') else message.replace('data', 'layout', 1)
+        raise InvalidLayoutError(message)
+
+    layout = dict(data)
+    if 'positions' in layout:
+        layout['positions'] = {
+            name: {
+                key: _number(value, 2 if key == 'scale' else 1)
+                for key, value in position.items()
+            }
+            for name, position in layout['positions'].items()
+        }
+    if 'sizes' in layout:
+        layout['sizes'] = {name: _number(size, 1) for name, size in layout['sizes'].items()}
+    if 'font_colors' in layout:
+        layout['font_colors'] = {name: color.lower() for name, color in layout['font_colors'].items()}
+    if 'custom_text' in layout:
+        layout['custom_text'] = layout['custom_text'].strip()
+    if 'bg_template_filename' in layout:
+        layout['bg_template_filename'] = layout['bg_template_filename'] or None
+    return layout
+
+
+def layout_json(layout):
+    """Compact, key-sorted JSON for print_layout_json."""
+    return json.dumps(layout, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def parse_layout_json(text):
+    """Parsed print_layout_json, or {} when missing or malformed."""
+    if not text:
+        return {}
+    try:
+        layout = json.loads(text)
+    except (ValueError, TypeError):
+        return {}
+    return layout if isinstance(layout, dict) else {}
+
+
+# ───────── Incremental saves ─────────
+
+def merge_patch(target, patch):
+    """Apply a JSON merge patch (RFC 7396) to ``target``; returns a new value."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def layout_etag(version):
+    return f"layout-{version or 0}"
+
+
+@event.listens_for(Card, 'before_update')
+def _bump_layout_version(mapper, connection, target):
+    if sa_inspect(target).attrs.print_layout_json.history.has_changes():
+        target.print_layout_version = (target.print_layout_version or 0) + 1
@@ -0,0 +1,503 @@
+"""
+Server-side rasterizer for printable cards.
+
+Reproduces print_card.html with Pillow at print resolution (3.5" x 2" at
+300 DPI), so a card can be printed or handed to a print shop without going
+through a browser. Coordinates in print_layout_json are in the 630 x 360 px
+space the designer works in and are scaled to PRINT_SIZE here.
+
+Rendering works from a plain, picklable spec (see build_render_spec) rather
+than the ORM object, so it can also run in worker processes. Each spec has
+a content hash over everything that affects the output; RenderCache keeps
+finished renders on disk under that hash, so an unchanged card is rendered
+once and then served from the cache by every worker.
+
+An uploaded background is referenced by its sha256 only; its bytes are
+loaded (with_background_data) just before a cache miss is rendered, so
+cache hits never touch the blob. The cache is kept within
+PRINT_CACHE_MAX_MB and PRINT_CACHE_MAX_AGE_DAYS by RenderCache.prune.
+"""
+import hashlib
+import io
+import json
+import os
+import time
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageOps
+
+from utils.images import InvalidImageError, PRINT_DPI, PRINT_SIZE, load_image
+from utils.qr_codes import render_qr
+
+
+# Bump when the drawing code changes so cached renders are not reused.
+RENDERER_VERSION = 1
+
+RENDER_FORMATS = {
+    'png': 'image/png',
+    'pdf': 'application/pdf',
+}
+
+# The designer / print_card.html coordinate space.
+LAYOUT_SIZE = (630, 360)
+SCALE = PRINT_SIZE[0] / LAYOUT_SIZE[0]
+
+BACKGROUND_COLORS = {
+    'matte_black': '#1a1a1a',
+    'matte_navy': '#0f1f3d',
+    'matte_forest': '#1a2f1a',
+    'matte_maroon': '#3d1a1a',
+    'matte_slate': '#2d3748',
+    'matte_beige': '#e8dcc8',
+}
+DARK_BACKGROUNDS = {'matte_black', 'matte_navy', 'matte_forest', 'matte_maroon', 'matte_slate'}
+
+ACCENT_COLORS = {
+    'orange': '#fc7800',
+    'blue': '#2563eb',
+    'green': '#10b981',
+    'purple': '#8b5cf6',
+    'red': '#ef4444',
+    'gold': '#f59e0b',
+}
+
+# RGBA colours from print_card.html: light text on dark backgrounds (True)
+# and dark text on light ones (False); None means the accent colour.
+TEXT_COLORS = {
+    True: {
+        'name': (255, 255, 255, 255),
+        'designation': None,
+        'company': (255, 255, 255, 166),
+        'contact': (255, 255, 255, 209),
+        'icon': (255, 255, 255, 128),
+        'custom_text': (255, 255, 255, 140),
+        'brand': (255, 255, 255, 32),
+    },
+    False: {
+        'name': (17, 17, 17, 255),
+        'designation': None,
+        'company': (55, 65, 81, 255),
+        'contact': (55, 65, 81, 255),
+        'icon': (156, 163, 175, 255),
+        'custom_text': (107, 114, 128, 255),
+        'brand': (0, 0, 0, 32),
+    },
+}
+
+# Defaults from print_card.html: position, font size (px), bold.
+ELEMENT_DEFAULTS = {
+    'name': {'x': 36, 'y': 56, 'size': 28, 'bold': True},
+    'designation': {'x': 36, 'y': 98, 'size': 10, 'bold': True},
+    'company': {'x': 36, 'y': 118, 'size': 13, 'bold': False},
+    'phone': {'x': 36, 'y': 163, 'size': 11, 'bold': False},
+    'email': {'x': 36, 'y': 187, 'size': 11, 'bold': False},
+    'website': {'x': 36, 'y': 211, 'size': 11, 'bold': False},
+    'address': {'x': 36, 'y': 235, 'size': 11, 'bold': False},
+    'custom_text': {'x': 36, 'y': 318, 'size': 10, 'bold': False},
+    'qr': {'x': 490, 'y': 50, 'size': 110},
+}
+CONTACT_FIELDS = ('phone', 'email', 'website', 'address')
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'fonts')
+FONT_CANDIDATES = {
+    False: ('Outfit-Regular.ttf', 'DejaVuSans.ttf'),
+    True: ('Outfit-Bold.ttf', 'DejaVuSans-Bold.ttf'),
+}
+
+
+# ───────── Spec ─────────
+
+def build_render_spec(card, layout, card_url, background_image=None, template_background=None):
+    """
+    Collect everything the renderer needs from ``card`` into a plain dict.
+
+    Args:
+        card: Card model instance
+        layout: parsed print_layout_json
+        card_url: public card URL encoded in the QR code
+        background_image: optional sha256 of the uploaded background (BackgroundImage)
+        template_background: optional path of the template background file
+    """
+    roles = card.roles
+    primary = roles[0] if roles else {}
+    website = card.website or ''
+    for prefix in ('https://', 'http://'):
+        website = website.replace(prefix, '')
+
+    background = {'color': layout.get('background', 'matte_black')}
+    if background_image:
+        background.update(image_sha256=background_image)
+    elif template_background and os.path.exists(template_background):
+        stat = os.stat(template_background)
+        background.update(template_path=template_background, template_stamp=(stat.st_size, int(stat.st_mtime)))
+
+    return {
+        'text': {
+            'name': card.name or '',
+            'designation': primary.get('designation') or card.designation or card.title or '',
+            'company': primary.get('company') or card.company or '',
+            'phone': card.phone or '',
+            'email': card.email or '',
+            'website': website,
+            'address': card.address or '',
+            'custom_text': layout.get('custom_text') or '',
+        },
+        'show': {
+            'phone': layout.get('show_phone', True),
+            'email': layout.get('show_email', True),
+            'website': layout.get('show_website', True),
+            'address': layout.get('show_address', False),
+        },
+        'positions': layout.get('positions') or {},
+        'sizes': layout.get('sizes') or {},
+        'font_colors': layout.get('font_colors') or {},
+        'accent': layout.get('accent', 'orange'),
+        'background': background,
+        'qr_data': card_url,
+    }
+
+
+def spec_hash(spec):
+    """Stable hash of every render input (an uploaded image is represented by its hash)."""
+    background = {k: v for k, v in spec['background'].items() if k != 'image_data'}
+    payload = dict(spec, background=background, renderer=RENDERER_VERSION)
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+# ───────── Drawing helpers ─────────
+
+_font_cache = {}
+
+
+def _font(size, bold=False):
+    key = (round(size), bold)
+    if key not in _font_cache:
+        font = None
+        for name in FONT_CANDIDATES[bold]:
+            for candidate in (os.path.join(FONT_DIR, name), name):
+                try:
+                    font = ImageFont.truetype(candidate, key[0])
+                    break
+                except OSError:
+                    continue
+            if font:
+                break
+        _font_cache[key] = font or ImageFont.load_default(key[0])
+    return _font_cache[key]
+
+
+def _px(value):
+    return round(float(value) * SCALE)
+
+
+def _color(value, fallback):
+    if value:
+        try:
+            rgb = ImageColor.getrgb(value)
+            return rgb if len(rgb) == 4 else rgb + (255,)
+        except ValueError:
+            pass
+    return fallback
+
+
+def _element(spec, name):
+    defaults = ELEMENT_DEFAULTS[name]
+    position = spec['positions'].get(name) or {}
+    size = spec['sizes'].get(name) or defaults['size']
+    try:
+        x, y, size = float(position.get('x', defaults['x'])), float(position.get('y', defaults['y'])), float(size)
+    except (TypeError, ValueError):
+        x, y, size = defaults['x'], defaults['y'], defaults['size']
+    return x, y, size
+
+
+def _draw_text(draw, xy, text, font, fill, tracking=0):
+    if not tracking:
+        draw.text(xy, text, font=font, fill=fill)
+        return
+    x, y = xy
+    for char in text:
+        draw.text((x, y), char, font=font, fill=fill)
+        x += draw.textlength(char, font=font) + tracking
+
+
+def _draw_icon(draw, kind, box, fill):
+    """Simple vector stand-ins for the SVG icons in print_card.html."""
+    x0, y0, x1, y1 = box
+    w, h = x1 - x0, y1 - y0
+    stroke = max(1, round(w / 10))
+    if kind == 'phone':
+        draw.rounded_rectangle((x0 + w * .25, y0, x1 - w * .25, y1), radius=w * .12, fill=fill)
+    elif kind == 'email':
+        top = y0 + h * .18
+        bottom = y1 - h * .18
+        draw.rectangle((x0, top, x1, bottom), outline=fill, width=stroke)
+        draw.line((x0, top, x0 + w / 2, top + (bottom - top) * .55, x1, top), fill=fill, width=stroke)
+    elif kind == 'website':
+        draw.ellipse(box, outline=fill, width=stroke)
+        draw.ellipse((x0 + w * .3, y0, x1 - w * .3, y1), outline=fill, width=stroke)
+        draw.line((x0, y0 + h / 2, x1, y0 + h / 2), fill=fill, width=stroke)
+    elif kind == 'address':
+        draw.ellipse((x0 + w * .2, y0, x1 - w * .2, y0 + h * .6), fill=fill)
+        draw.polygon(((x0 + w * .25, y0 + h * .4), (x1 - w * .25, y0 + h * .4), (x0 + w / 2, y1)), fill=fill)
+
+
+def _wrap(draw, text, font, max_width):
+    """Greedy word wrap to ``max_width`` pixels."""
+    lines = []
+    for paragraph in text.splitlines() or ['']:
+        words = paragraph.split()
+        line = ''
+        for word in words:
+            candidate = f"{line} {word}".strip()
+            if line and draw.textlength(candidate, font=font) > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def _background(spec):
+    background = spec['background']
+    color = BACKGROUND_COLORS.get(background.get('color'), BACKGROUND_COLORS['matte_black'])
+    canvas = Image.new('RGB', PRINT_SIZE, color)
+
+    source = None
+    try:
+        if background.get('image_data'):
+            source = load_image(background['image_data'], draft_size=PRINT_SIZE)
+        elif background.get('template_path'):
+            with open(background['template_path'], 'rb') as fh:
+                source = load_image(fh.read(), draft_size=PRINT_SIZE)
+    except (InvalidImageError, OSError):
+        source = None
+
+    if source is not None:
+        # background-size: cover; background-position: center
+        fitted = ImageOps.fit(source.convert('RGBA'), PRINT_SIZE, Image.LANCZOS)
+        canvas.paste(fitted, (0, 0), fitted)
+    return canvas
+
+
+def _draw_qr(layer, draw, spec, accent):
+    x, y, size = _element(spec, 'qr')
+    left, top, box = _px(x), _px(y), _px(size)
+    border = _px(3)
+    draw.rounded_rectangle(
+        (left, top, left + box - 1, top + box - 1),
+        radius=_px(10), fill=(255, 255, 255, 255), outline=accent, width=border,
+    )
+
+    label_font = _font(6.5 * SCALE, bold=True)
+    label = 'SCAN ME'
+    label_height = _px(6.5) + _px(3)
+    inner = box - 2 * (border + _px(6))
+    qr_size = max(1, inner - label_height)
+
+    # Bypass the QR LRU: print renders (cached on disk already) would only
+    # evict the web /qr entries.
+    qr_png, _ = render_qr.__wrapped__(spec['qr_data'], box_size=10, border=0)
+    with Image.open(io.BytesIO(qr_png)) as qr_image:
+        qr_image = qr_image.convert('RGBA').resize((qr_size, qr_size), Image.NEAREST)
+        layer.paste(qr_image, (left + (box - qr_size) // 2, top + border + _px(6)))
+
+    label_width = draw.textlength(label, font=label_font) + len(label) * _px(.8)
+    _draw_text(
+        draw,
+        (left + (box - label_width) / 2, top + border + _px(6) + qr_size + _px(1)),
+        label, label_font, (156, 163, 175, 255), tracking=_px(.8),
+    )
+
+
+# ───────── Rendering ─────────
+
+def render_card_image(spec):
+    """Rasterize ``spec`` to an RGB PIL image of PRINT_SIZE."""
+    background = spec['background'].get('color')
+    dark = background in DARK_BACKGROUNDS
+    palette = TEXT_COLORS[dark]
+    accent = _color(ACCENT_COLORS.get(spec['accent']), (252, 120, 0, 255))
+    font_colors = spec['font_colors']
+    text = spec['text']
+
+    # Everything is drawn on a transparent layer and composited at the end;
+    # ImageDraw ignores the alpha of text drawn straight onto RGB.
+    canvas = _background(spec)
+    layer = Image.new('RGBA', PRINT_SIZE, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+
+    for name, tracking, transform in (
+        ('name', -.5, None),
+        ('designation', 1.8, str.upper),
+        ('company', .1, None),
+    ):
+        value = text[name]
+        if not value:
+            continue
+        x, y, size = _element(spec, name)
+        fill = _color(font_colors.get(name), palette[name] or accent)
+        font = _font(size * SCALE, ELEMENT_DEFAULTS[name]['bold'])
+        _draw_text(draw, (_px(x), _px(y)), transform(value) if transform else value, font, fill, _px(tracking))
+
+    for name in CONTACT_FIELDS:
+        value = text[name]
+        if not (spec['show'][name] and value):
+            continue
+        x, y, size = _element(spec, name)
+        fill = _color(font_colors.get(name), palette['contact'])
+        icon_fill = fill if font_colors.get(name) else palette['icon']
+        font = _font(size * SCALE)
+        em = _px(size)
+        left, top = _px(x), _px(y)
+        _draw_icon(draw, name, (left, top + em * .1, left + em, top + em * 1.1), icon_fill)
+        text_left = left + em + _px(6)
+
+        # print_card.html wraps the address when it sits in the right column.
+        if name == 'address' and x >= 300:
+            lines = _wrap(draw, value, font, _px(170) - em - _px(6))
+        else:
+            lines = [value]
+        for index, line in enumerate(lines):
+            draw.text((text_left, top + index * em * 1.3), line, font=font, fill=fill)
+
+    if text['custom_text']:
+        x, y, size = _element(spec, 'custom_text')
+        fill = _color(font_colors.get('custom_text'), palette['custom_text'])
+        fill = fill[:3] + (round(fill[3] * .8),)
+        font = _font(size * SCALE)
+        line_height = _px(size) * 1.5
+        for index, line in enumerate(_wrap(draw, text['custom_text'], font, _px(260))):
+            draw.text((_px(x), _px(y) + index * line_height), line, font=font, fill=fill)
+
+    _draw_qr(layer, draw, spec, accent)
+
+    brand_font = _font(7 * SCALE)
+    brand = 'CardCraft'
+    brand_fill = palette['brand'][:3] + (round(palette['brand'][3] * .7),)
+    brand_width = draw.textlength(brand, font=brand_font) + len(brand) * _px(.4)
+    _draw_text(
+        draw,
+        (PRINT_SIZE[0] - _px(14) - brand_width, PRINT_SIZE[1] - _px(9) - _px(7)),
+        brand, brand_font, brand_fill, tracking=_px(.4),
+    )
+    return Image.alpha_composite(canvas.convert('RGBA'), layer).convert('RGB')
+
+
+def encode_render(image, fmt):
+    """Encode a rendered card as PNG or single-page PDF at PRINT_DPI."""
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        image.save(buffer, format='PNG', dpi=PRINT_DPI, optimize=True)
+    elif fmt == 'pdf':
+        image.save(buffer, format='PDF', resolution=float(PRINT_DPI[0]))
+    else:
+        raise ValueError(f"Unsupported render format: {fmt}")
+    return buffer.getvalue()
+
+
+def render_card(spec, fmt='png'):
+    """Render ``spec`` and return the encoded bytes."""
+    return encode_render(render_card_image(spec), fmt)
+
+
+# ───────── Cache ─────────
+
+def with_background_data(spec, load_background):
+    """``spec`` with the uploaded background's bytes attached, ready to render."""
+    background = spec['background']
+    sha256 = background.get('image_sha256')
+    if not sha256 or 'image_data' in background or load_background is None:
+        return spec
+    return dict(spec, background=dict(background, image_data=load_background(sha256)))
+
+
+class RenderCache:
+    """
+    Finished renders on disk as ``<spec hash>.<format>``, shared by all workers.
+
+    A hit refreshes the file's mtime, and every PRUNE_EVERY writes the
+    process prunes files unused for ``max_age`` seconds, then the least
+    recently used ones until the cache is within ``max_bytes``.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, directory, max_bytes=None, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def has(self, key, fmt):
+        return os.path.exists(self._path(key, fmt))
+
+    def get(self, key, fmt):
+        path = self._path(key, fmt)
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key, fmt, data):
+        path = self._path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Enforce max_age and max_bytes; returns the number of files removed."""
+        if not self.max_bytes and not self.max_age:
+            return 0
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        cutoff = time.time() - self.max_age if self.max_age else None
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            expired = cutoff is not None and mtime < cutoff
+            if not expired and not (self.max_bytes and total > self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def get_or_render(self, spec, fmt, load_background=None):
+        """
+        Return (bytes, key), rendering only on a cache miss.
+
+        ``load_background(sha256)`` supplies the uploaded background's bytes
+        for the render; it is not called on a hit.
+        """
+        key = spec_hash(spec)
+        data = self.get(key, fmt)
+        if data is None:
+            data = render_card(with_background_data(spec, load_background), fmt)
+            self.set(key, fmt, data)
+        return data, key
@@ -0,0 +1,266 @@
+"""
+N-up print sheets: many cards per A4/Letter page, with crop marks.
+
+Cards are rasterized by utils/print_renderer.py in a pool of worker
+processes (rendering is CPU bound, so threads would serialize on the GIL)
+and placed on the sheet as image XObjects. The PDF is written by a small
+streaming writer: each page is emitted as soon as its cards are rendered,
+and only the cross-reference table is written at the end. So the first page
+reaches the client while later ones are still rendering, and memory holds
+a few pages of cards at most.
+
+Crop marks are vector lines in the sheet margins, aligned with every cut.
+
+Workers are started with "spawn", and a spawned process re-imports the
+parent's main script as ``__mp_main__`` before it can take work. Only the
+worker function in this module (and utils/print_renderer.py) runs there,
+but a script that renders sheets must keep its own start-up work under
+``if __name__ == "__main__":``. app.py skips its database setup when
+imported as ``__mp_main__``; under gunicorn or ``flask`` the main module
+is not app.py and nothing is re-run.
+"""
+import io
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from utils.print_renderer import render_card, spec_hash, with_background_data
+
+
+# Points (1/72 in).
+SHEET_SIZES = {
+    'a4': (595.28, 841.89),
+    'letter': (612.0, 792.0),
+}
+CARD_SIZE = (252.0, 144.0)  # 3.5" x 2"
+
+# cards per sheet -> (columns, rows, gutter between cards)
+SHEET_LAYOUTS = {
+    8: (2, 4, 18.0),
+    10: (2, 5, 0.0),
+}
+
+CROP_MARK_OFFSET = 6.0
+CROP_MARK_LENGTH = 18.0
+CROP_MARK_WIDTH = 0.25
+
+PRINT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+
+# ───────── Geometry ─────────
+
+def sheet_slots(sheet, per_sheet):
+    """Lower-left corners (PDF coordinates) of each card slot, top row first."""
+    width, height = SHEET_SIZES[sheet]
+    columns, rows, gutter = SHEET_LAYOUTS[per_sheet]
+    block_w = columns * CARD_SIZE[0] + (columns - 1) * gutter
+    block_h = rows * CARD_SIZE[1] + (rows - 1) * gutter
+    left = (width - block_w) / 2
+    top = (height + block_h) / 2
+    slots = []
+    for row in range(rows):
+        for column in range(columns):
+            x = left + column * (CARD_SIZE[0] + gutter)
+            y = top - (row + 1) * CARD_SIZE[1] - row * gutter
+            slots.append((x, y))
+    return slots
+
+
+def crop_mark_ops(sheet, per_sheet):
+    """PDF content-stream operators drawing crop marks for every cut line."""
+    width, height = SHEET_SIZES[sheet]
+    slots = sheet_slots(sheet, per_sheet)
+    cuts_x = sorted({round(x, 2) for x, _ in slots} | {round(x + CARD_SIZE[0], 2) for x, _ in slots})
+    cuts_y = sorted({round(y, 2) for _, y in slots} | {round(y + CARD_SIZE[1], 2) for _, y in slots})
+    block = (cuts_x[0], cuts_y[0], cuts_x[-1], cuts_y[-1])
+
+    ops = [f"q {CROP_MARK_WIDTH} w 0 0 0 RG"]
+    for x in cuts_x:
+        for y_start, direction in ((block[3] + CROP_MARK_OFFSET, 1), (block[1] - CROP_MARK_OFFSET, -1)):
+            y_end = min(max(y_start + direction * CROP_MARK_LENGTH, 0), height)
+            ops.append(f"{x} {y_start:.2f} m {x} {y_end:.2f} l S")
+    for y in cuts_y:
+        for x_start, direction in ((block[0] - CROP_MARK_OFFSET, -1), (block[2] + CROP_MARK_OFFSET, 1)):
+            x_end = min(max(x_start + direction * CROP_MARK_LENGTH, 0), width)
+            ops.append(f"{x_start:.2f} {y} m {x_end:.2f} {y} l S")
+    ops.append("Q")
+    return "\n".join(ops)
+
+
+# ───────── Rendering (worker processes) ─────────
+
+def _render_for_sheet(spec, cache):
+    """Worker: return (width, height, zlib-compressed RGB) for one card."""
+    key = spec_hash(spec)
+    png = cache.get(key, 'png') if cache else None
+    if png is None:
+        png = render_card(spec, 'png')
+        if cache:
+            cache.set(key, 'png', png)
+    with Image.open(io.BytesIO(png)) as image:
+        image = image.convert('RGB')
+        return image.width, image.height, zlib.compress(image.tobytes(), 6)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    # "spawn" so workers never inherit locks held by the web worker's threads.
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=PRINT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def iter_rendered(specs, cache=None, load_background=None, window=20):
+    """Render ``specs`` on the process pool, yielding results in order.
+
+    At most ``window`` cards are in flight, so a long job never queues
+    every card (and its background image) at once. Background bytes are
+    only loaded and shipped to a worker for cards missing from ``cache``.
+    """
+    pool = _get_pool()
+    pending = deque()
+    for spec in specs:
+        if cache is None or not cache.has(spec_hash(spec), 'png'):
+            spec = with_background_data(spec, load_background)
+        pending.append(pool.submit(_render_for_sheet, spec, cache))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# ───────── Streaming PDF writer ─────────
+
+class StreamingPdf:
+    """Minimal PDF writer that hands back bytes as objects are added."""
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = 3
+        self.page_ids = []
+
+    def _reserve(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _object(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.offset
+        data = f"{obj_id} 0 obj\n".encode() + body.encode()
+        if stream is not None:
+            data += b"\nstream\n" + stream + b"\nendstream"
+        data += b"\nendobj\n"
+        self.offset += len(data)
+        return data
+
+    def begin(self):
+        data = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.offset += len(data)
+        return data
+
+    def add_page(self, size, images, extra_ops=''):
+        """
+        Add a page with ``images`` placed on it.
+
+        Args:
+            size: (width, height) in points
+            images: list of ((x, y, w, h), (pixel width, pixel height, zlib RGB))
+            extra_ops: more content-stream operators (drawn on top)
+        """
+        chunks = []
+        names = {}
+        ops = []
+        for index, ((x, y, w, h), (px_w, px_h, data)) in enumerate(images):
+            image_id = self._reserve()
+            chunks.append(self._object(
+                image_id,
+                f"<< /Type /XObject /Subtype /Image /Width {px_w} /Height {px_h} /ColorSpace /DeviceRGB "
+                f"/BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>",
+                data,
+            ))
+            names[f"Im{index}"] = image_id
+            ops.append(f"q {w:.2f} 0 0 {h:.2f} {x:.2f} {y:.2f} cm /Im{index} Do Q")
+        if extra_ops:
+            ops.append(extra_ops)
+
+        content = "\n".join(ops).encode()
+        content_id = self._reserve()
+        chunks.append(self._object(content_id, f"<< /Length {len(content)} >>", content))
+
+        xobjects = " ".join(f"/{name} {obj_id} 0 R" for name, obj_id in names.items())
+        page_id = self._reserve()
+        chunks.append(self._object(
+            page_id,
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {size[0]:.2f} {size[1]:.2f}] "
+            f"/Resources << /XObject << {xobjects} >> >> /Contents {content_id} 0 R >>",
+        ))
+        self.page_ids.append(page_id)
+        return b"".join(chunks)
+
+    def finish(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        chunks = [
+            self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>"),
+            self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>"),
+        ]
+        xref_offset = self.offset
+        lines = [f"xref\n0 {self.next_id}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, self.next_id):
+            lines.append(f"{self.offsets[obj_id]:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {self.next_id} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        chunks.append("".join(lines).encode())
+        return b"".join(chunks)
+
+
+def iter_sheet_pdf(specs, sheet='a4', per_sheet=10, crop_marks=True, cache=None, load_background=None):
+    """
+    Impose rendered cards ``per_sheet`` to a page and stream the PDF.
+
+    Args:
+        specs: iterable of render specs (see print_renderer.build_render_spec)
+        sheet: 'a4' or 'letter'
+        per_sheet: 8 or 10
+        crop_marks: draw crop marks in the margins
+        cache: RenderCache shared with the single-card renderer
+        load_background: sha256 -> bytes of an uploaded background, for misses
+
+    Yields:
+        bytes: PDF chunks (one or more per page)
+    """
+    if sheet not in SHEET_SIZES:
+        raise ValueError(f"Unsupported sheet size: {sheet}")
+    if per_sheet not in SHEET_LAYOUTS:
+        raise ValueError(f"Unsupported cards per sheet: {per_sheet}")
+
+    size = SHEET_SIZES[sheet]
+    slots = sheet_slots(sheet, per_sheet)
+    marks = crop_mark_ops(sheet, per_sheet) if crop_marks else ''
+
+    pdf = StreamingPdf()
+    yield pdf.begin()
+    page = []
+    for rendered in iter_rendered(specs, cache, load_background, window=2 * per_sheet):
+        x, y = slots[len(page)]
+        page.append(((x, y, CARD_SIZE[0], CARD_SIZE[1]), rendered))
+        if len(page) == per_sheet:
+            yield pdf.add_page(size, page, marks)
+            page = []
+    if page or not pdf.page_ids:
+        yield pdf.add_page(size, page, marks)
+    yield pdf.finish()
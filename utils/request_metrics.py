@@ -0,0 +1,254 @@
+"""
+Per-request instrumentation: Server-Timing header and Prometheus metrics.
+
+For every Flask request the middleware below records:
+
+- wall time, from the first before_request hook to after_request
+- SQL statements and the time spent executing them (engine events on every
+  engine, so replica reads count too)
+- named spans opened with ``timed``: "iam" (load_iam_data), "qr" (QR
+  rendering on a cache miss) and "render" (Jinja templates, through Flask's
+  template signals)
+
+The breakdown is sent back as a ``Server-Timing`` header (SERVER_TIMING=0
+turns it off), e.g. ``total;dur=41.2, db;dur=6.3;desc="4 queries", iam;dur=30.1``
+so browser devtools show it next to the request, and it feeds histograms
+labelled by endpoint, served in Prometheus text format by /metrics (only
+once METRICS_TOKEN is set, and to requests bearing it). A
+sudden rise in sql_queries_per_request for an endpoint is exactly what a
+repeated user lookup looks like.
+
+Metrics live in the process; each gunicorn worker exposes its own, so
+scrape workers individually or read the numbers as per-worker samples.
+Streamed responses are measured up to the point the body starts streaming,
+and requests answered by the ASGI fast paths (asgi.py) are not seen.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRIC_PREFIX = 'cardmaker'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# Requests that match no route share one label, so bad URLs cannot grow
+# the number of series.
+UNMATCHED_ENDPOINT = 'unmatched'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Prometheus counter with fixed label names."""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labels, labels)} {_format_number(value)}')
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram (cumulative buckets, sum and count) with fixed label names."""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count))
+                            for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labels, labels, [('le', _format_number(bound))])
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            label_text = _format_labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_number(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+# ───────── Spans ─────────
+
+def _current():
+    """The current request's measurements, or None outside an instrumented request."""
+    if not has_request_context():
+        return None
+    return g.get('_request_metrics')
+
+
+def _add_span(name, seconds, count=1):
+    measurements = _current()
+    if measurements is None:
+        return
+    span = measurements['spans'].setdefault(name, [0.0, 0])
+    span[0] += seconds
+    span[1] += count
+
+
+@contextmanager
+def timed(name):
+    """Add the block's wall time to span ``name`` of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_span(name, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None:
+        _add_span('db', time.perf_counter() - started)
+
+
+def _template_started(sender, template, context, **extra):
+    measurements = _current()
+    if measurements is not None:
+        measurements['templates'].append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    measurements = _current()
+    if measurements is not None and measurements['templates']:
+        _add_span('render', time.perf_counter() - measurements['templates'].pop())
+
+
+# ───────── Middleware ─────────
+
+class RequestMetrics:
+    """Time Flask requests; expose Server-Timing headers and Prometheus metrics."""
+
+    def __init__(self, app=None):
+        self.server_timing = True
+        self.request_duration = Histogram(
+            f'{METRIC_PREFIX}_request_duration_seconds', 'Wall time per request.',
+            ('endpoint',), DURATION_BUCKETS,
+        )
+        self.requests = Counter(
+            f'{METRIC_PREFIX}_requests_total', 'Requests by endpoint and status.',
+            ('endpoint', 'method', 'status'),
+        )
+        self.sql_queries = Histogram(
+            f'{METRIC_PREFIX}_sql_queries_per_request', 'SQL statements executed per request.',
+            ('endpoint',), QUERY_COUNT_BUCKETS,
+        )
+        self.sql_duration = Histogram(
+            f'{METRIC_PREFIX}_sql_duration_seconds', 'Time spent executing SQL per request.',
+            ('endpoint',), DURATION_BUCKETS,
+        )
+        self.span_duration = Histogram(
+            f'{METRIC_PREFIX}_span_duration_seconds',
+            'Time per request in instrumented work (iam, qr, render).',
+            ('endpoint', 'span'), DURATION_BUCKETS,
+        )
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.server_timing = bool(app.config.get('SERVER_TIMING', True))
+        # First, so the IAM load in the other before_request hooks is inside
+        # the measured time.
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(_template_started, app)
+        template_rendered.connect(_template_finished, app)
+
+    def _start(self):
+        g._request_metrics = {'started': time.perf_counter(), 'spans': {}, 'templates': []}
+
+    def _finish(self, response):
+        measurements = g.pop('_request_metrics', None)
+        if measurements is None:
+            return response
+        elapsed = time.perf_counter() - measurements['started']
+        spans = measurements['spans']
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        db_seconds, queries = spans.pop('db', (0.0, 0))
+
+        self.request_duration.observe((endpoint,), elapsed)
+        self.requests.inc((endpoint, request.method, str(response.status_code)))
+        self.sql_queries.observe((endpoint,), queries)
+        self.sql_duration.observe((endpoint,), db_seconds)
+        for name, (seconds, _) in spans.items():
+            self.span_duration.observe((endpoint, name), seconds)
+
+        if self.server_timing:
+            noun = 'query' if queries == 1 else 'queries'
+            entries = [f'total;dur={elapsed * 1000:.1f}',
+                       f'db;dur={db_seconds * 1000:.1f};desc="{queries} {noun}"']
+            entries.extend(f'{name};dur={seconds * 1000:.1f}' for name, (seconds, _) in sorted(spans.items()))
+            response.headers.add('Server-Timing', ', '.join(entries))
+        return response
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        lines = []
+        for metric in (self.requests, self.request_duration, self.sql_queries, self.sql_duration, self.span_duration):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
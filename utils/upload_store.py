@@ -0,0 +1,207 @@
+"""
+Content-addressed storage for uploaded card pictures.
+
+Files are named after the SHA-256 of their (normalized) bytes and sharded
+into two directory levels under static/uploads:
+
+    cas/3f/a2/3fa2...e9.jpg
+
+Identical pictures are stored once no matter how many cards use them, and a
+stored file never changes, so it can be served with ``immutable`` caching.
+Every card field pointing at a file holds one reference in StoredUpload;
+files whose count has dropped to zero are removed by ``collect_garbage``
+(``flask uploads gc``) after a grace period. The file is written before
+the request commits its row, so gc also sweeps files that never got a row
+(the request rolled back or died) once they are past the grace period.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db, Card, StoredUpload
+from utils.db_utils import insert_ignore
+from utils.images import IMAGE_KINDS, remove_variants, schedule_variants
+
+
+CAS_PREFIX = 'cas/'
+
+# Unreferenced files are kept this long before being deleted, so a
+# concurrent upload of the same picture never loses its file.
+GC_GRACE_PERIOD = timedelta(hours=1)
+
+
+def is_content_addressed(filename):
+    return bool(filename) and filename.replace('\\', '/').startswith(CAS_PREFIX)
+
+
+class UploadStore:
+    """Reference-counted file store rooted at ``root`` (static/uploads)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, filename):
+        return os.path.join(self.root, *filename.split('/'))
+
+    # ───────── Writing ─────────
+
+    def store(self, data, ext, kind):
+        """
+        Store ``data`` (if not already present), take one reference on it and
+        queue its responsive variants. Changes are flushed, not committed.
+
+        Returns:
+            str: filename relative to the upload root
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        filename = f"{CAS_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+        path = self.path_for(filename)
+
+        try:
+            # Already stored: a fresh mtime keeps gc from sweeping it before
+            # this request's row commits.
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        schedule_variants(path, kind)
+
+        db.session.execute(
+            insert_ignore(StoredUpload).values(sha256=digest, filename=filename, ref_count=0)
+        )
+        db.session.execute(
+            update(StoredUpload)
+            .where(StoredUpload.sha256 == digest)
+            .values(ref_count=StoredUpload.ref_count + 1, released_at=None)
+        )
+        return filename
+
+    def release(self, filename):
+        """Drop one reference on ``filename``. Legacy (non-hashed) names are ignored."""
+        if not is_content_addressed(filename):
+            return
+        db.session.execute(
+            update(StoredUpload)
+            .where(StoredUpload.filename == filename, StoredUpload.ref_count > 0)
+            .values(ref_count=StoredUpload.ref_count - 1)
+        )
+        db.session.execute(
+            update(StoredUpload)
+            .where(StoredUpload.filename == filename, StoredUpload.ref_count == 0,
+                   StoredUpload.released_at.is_(None))
+            .values(released_at=datetime.utcnow())
+        )
+
+    # ───────── Maintenance ─────────
+
+    def collect_garbage(self, grace_period=GC_GRACE_PERIOD):
+        """
+        Delete files (and their variants) nobody has referenced for
+        ``grace_period``, and files that never got a StoredUpload row.
+        """
+        cutoff = datetime.utcnow() - grace_period
+        orphans = db.session.query(StoredUpload.id, StoredUpload.filename).filter(
+            StoredUpload.ref_count <= 0,
+            StoredUpload.released_at.isnot(None),
+            StoredUpload.released_at < cutoff,
+        ).all()
+
+        removed = 0
+        for upload_id, filename in orphans:
+            # Re-check under the delete itself in case the file was re-used.
+            deleted = StoredUpload.query.filter(
+                StoredUpload.id == upload_id, StoredUpload.ref_count <= 0
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            if not deleted:
+                continue
+            path = self.path_for(filename)
+            for kind in IMAGE_KINDS:
+                remove_variants(path, kind)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed += 1
+        return removed + self._sweep_untracked(time.time() - grace_period.total_seconds())
+
+    def _sweep_untracked(self, cutoff):
+        """Delete stored files older than ``cutoff`` (epoch seconds) that have no StoredUpload row."""
+        candidates = {}
+        for directory, _, names in os.walk(self.path_for(CAS_PREFIX.rstrip('/'))):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                if name.endswith('.tmp'):
+                    # A write that never reached os.replace.
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                elif name.count('.') == 1:
+                    # Originals only; variants go with them.
+                    filename = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    candidates[filename] = path
+
+        removed = 0
+        names = sorted(candidates)
+        for start in range(0, len(names), 500):
+            batch = names[start:start + 500]
+            tracked = {row[0] for row in db.session.query(StoredUpload.filename)
+                       .filter(StoredUpload.filename.in_(batch))}
+            for filename in batch:
+                if filename in tracked:
+                    continue
+                path = candidates[filename]
+                for kind in IMAGE_KINDS:
+                    remove_variants(path, kind)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                removed += 1
+        return removed
+
+    def import_legacy(self):
+        """
+        Move pre-hash uploads (``profile_<id>_<name>``) into the store and
+        repoint the cards using them. Returns the number of cards updated.
+        """
+        fields = (('profile_pic', 'profile'), ('banner_pic', 'banner'))
+        updated = 0
+        legacy_files = set()
+        card_ids = [row[0] for row in db.session.query(Card.id).order_by(Card.id)]
+        for card_id in card_ids:
+            card = db.session.get(Card, card_id)
+            for field, kind in fields:
+                filename = getattr(card, field)
+                if not filename or is_content_addressed(filename):
+                    continue
+                path = self.path_for(filename)
+                if not os.path.exists(path):
+                    continue
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+                ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'bin'
+                setattr(card, field, self.store(data, ext, kind))
+                legacy_files.add((path, kind))
+                updated += 1
+            db.session.commit()
+
+        for path, kind in legacy_files:
+            remove_variants(path, kind)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return updated
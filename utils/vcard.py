@@ -0,0 +1,197 @@
+"""
+vCard (RFC 2426 / RFC 6350) generation for download_contact.
+
+Values are escaped and long lines folded per the spec, and output uses CRLF
+line endings, so names or addresses containing commas, semicolons or
+newlines survive the import intact. Both 3.0 (widest phone support) and 4.0
+are produced from the same property list.
+
+Generated cards are cached per (card, Card.version, vCard version); since
+every card update bumps Card.version, a cached entry can never be stale.
+"""
+import base64
+import hashlib
+import io
+import unicodedata
+from urllib.parse import quote
+
+from PIL import Image
+
+from utils.images import InvalidImageError, load_image
+from utils.ttl_cache import TTLCache
+
+
+VCARD_VERSIONS = ('3.0', '4.0')
+
+PHOTO_SIZE = 256
+PHOTO_QUALITY = 80
+
+SOCIAL_FIELDS = ('linkedin', 'twitter', 'instagram', 'facebook', 'youtube')
+
+FOLD_WIDTH = 75
+
+VCARD_CACHE_SIZE = 1024
+VCARD_CACHE_TTL = 3600
+
+vcard_cache = TTLCache(maxsize=VCARD_CACHE_SIZE, ttl=VCARD_CACHE_TTL)
+
+
+def escape_value(value):
+    """Escape a text value (backslash, comma, semicolon, newline)."""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace(',', '\\,')
+        .replace(';', '\\;')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+        .replace('\r', '\\n')
+    )
+
+
+def uri_value(value):
+    """A URI value (URL, X-SOCIALPROFILE): not text-escaped, line breaks dropped."""
+    return ''.join(str(value).splitlines()).strip()
+
+
+def fold_line(line):
+    """Fold a content line to 75 octets without splitting UTF-8 sequences."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= FOLD_WIDTH:
+        return line
+
+    parts = []
+    current = ''
+    current_len = 0
+    limit = FOLD_WIDTH
+    for char in line:
+        char_len = len(char.encode('utf-8'))
+        if current_len + char_len > limit:
+            parts.append(current)
+            current, current_len = '', 0
+            limit = FOLD_WIDTH - 1  # continuation lines start with a space
+        current += char
+        current_len += char_len
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def downscale_photo(data):
+    """Return (jpeg bytes) of ``data`` scaled to PHOTO_SIZE, or None if unusable."""
+    try:
+        image = load_image(data, draft_size=(PHOTO_SIZE, PHOTO_SIZE))
+    except InvalidImageError:
+        return None
+    image.thumbnail((PHOTO_SIZE, PHOTO_SIZE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, format='JPEG', quality=PHOTO_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _split_name(full_name):
+    """Best-effort (family, given) split for the structured N property."""
+    parts = (full_name or '').split()
+    if len(parts) < 2:
+        return '', full_name or ''
+    return parts[-1], ' '.join(parts[:-1])
+
+
+def _whatsapp_url(number):
+    digits = ''.join(ch for ch in number if ch.isdigit())
+    return f"https://wa.me/{digits}" if digits else None
+
+
+def build_vcard(card, version='3.0', photo=None, card_url=None):
+    """
+    Build a vCard for ``card``.
+
+    Args:
+        card: Card model instance
+        version: '3.0' or '4.0'
+        photo: optional JPEG bytes (already downscaled) to embed
+        card_url: optional public URL of the card page
+
+    Returns:
+        str: the vCard text with CRLF line endings
+    """
+    if version not in VCARD_VERSIONS:
+        raise ValueError(f"Unsupported vCard version: {version}")
+    v4 = version == '4.0'
+
+    lines = ['BEGIN:VCARD', f'VERSION:{version}']
+
+    full_name = (card.name or '').strip()
+    family, given = _split_name(full_name)
+    lines.append(f'FN:{escape_value(full_name or card.company or "Contact")}')
+    lines.append(f'N:{escape_value(family)};{escape_value(given)};;;')
+
+    roles = [role for role in card.roles if role.get('designation') or role.get('company')]
+    if roles:
+        primary = roles[0]
+        if primary.get('company'):
+            lines.append(f'ORG:{escape_value(primary["company"])}')
+        if primary.get('designation'):
+            lines.append(f'TITLE:{escape_value(primary["designation"])}')
+
+    if card.phone:
+        if v4:
+            lines.append(f'TEL;TYPE=cell;VALUE=text:{escape_value(card.phone)}')
+        else:
+            lines.append(f'TEL;TYPE=CELL:{escape_value(card.phone)}')
+    if card.email:
+        lines.append(f'EMAIL;TYPE={"work" if v4 else "INTERNET"}:{escape_value(card.email)}')
+    if card.address:
+        # Stored as free text, so it goes in the street component.
+        lines.append(f'ADR;TYPE={"work" if v4 else "WORK"}:;;{escape_value(card.address)};;;;')
+    if card.website:
+        lines.append(f'URL:{uri_value(card.website)}')
+    if card_url:
+        lines.append(f'URL;TYPE={"home" if v4 else "HOME"}:{uri_value(card_url)}')
+
+    for network in SOCIAL_FIELDS:
+        url = getattr(card, network, None)
+        if url:
+            lines.append(f'X-SOCIALPROFILE;TYPE={network}:{uri_value(url)}')
+    if card.whatsapp:
+        url = _whatsapp_url(card.whatsapp)
+        if url:
+            lines.append(f'X-SOCIALPROFILE;TYPE=whatsapp:{uri_value(url)}')
+
+    notes = []
+    if len(roles) > 1:
+        for role in roles:
+            notes.append(' — '.join(part for part in (role.get('designation'), role.get('company')) if part))
+    bio = roles[0].get('bio') if roles else card.bio
+    if bio:
+        notes.append(bio)
+    if notes:
+        lines.append(f'NOTE:{escape_value(chr(10).join(notes))}')
+
+    if photo:
+        encoded = base64.b64encode(photo).decode('ascii')
+        if v4:
+            lines.append(f'PHOTO:data:image/jpeg;base64,{encoded}')
+        else:
+            lines.append(f'PHOTO;ENCODING=b;TYPE=JPEG:{encoded}')
+
+    lines.append('END:VCARD')
+    return '\r\n'.join(fold_line(line) for line in lines) + '\r\n'
+
+
+def vcard_etag(card_id, card_version, vcard_version, card_url):
+    """
+    ETag for a generated vCard; derived from metadata only.
+
+    The embedded card URL is part of it, so a deployment reached under
+    several hostnames never revalidates one host's vCard against another's.
+    """
+    url_hash = hashlib.sha256(card_url.encode('utf-8')).hexdigest()[:12]
+    return f"vcf-{card_id}-{card_version or 0}-{vcard_version}-{url_hash}"
+
+
+def vcard_content_disposition(name):
+    """attachment header with an ASCII fallback and an RFC 5987 UTF-8 name."""
+    filename = f"{(name or 'contact').strip() or 'contact'}.vcf"
+    fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    fallback = ''.join(ch for ch in fallback if ch not in '"\\/;\r\n') or 'contact.vcf'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
@@ -0,0 +1,259 @@
+"""
+Time-series view analytics.
+
+View counts are kept pre-aggregated per card per hour (CardViewHourly) and
+per card per day (CardViewDaily). The view recorder adds each flushed batch
+to both tables with one upsert each (add_to_rollups), so charts never scan
+raw CardView rows.
+
+Raw CardView rows are only needed to recognise returning visitors. Every
+row is already counted in the rollups, either incrementally or through the
+one-off backfill (backfill_rollups), so rows older than the retention window
+can be deleted without losing history (compact_views). A visitor whose row
+has been compacted away counts as new again on their next visit, unless
+visitors are counted with sketches (utils/visitor_sketches.py).
+
+Trend series are bucketed, gap-filled and smoothed with pandas.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, select
+
+from models import db, Card, CardView, CardViewDaily, CardViewHourly, CardVisitorSketch, CardVisitorSketchDaily
+from utils.db_utils import insert_ignore, insert_or_increment
+from utils.visitor_sketches import window_uniques
+
+
+MAX_DAYS = 366
+MAX_HOURLY_DAYS = 14
+BACKFILL_CHUNK_SIZE = 50_000
+MOVING_AVERAGE_DAYS = 7
+
+
+def hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+# ───────── Incremental maintenance ─────────
+
+def add_to_rollups(counts):
+    """
+    Add view counts to the hourly and daily rollups (not committed).
+
+    Args:
+        counts: iterable of (card_id, hour bucket, views, new_visitors)
+    """
+    hourly = defaultdict(lambda: [0, 0])
+    daily = defaultdict(lambda: [0, 0])
+    for card_id, bucket, views, new_visitors in counts:
+        for totals in (hourly[(card_id, bucket)], daily[(card_id, bucket.date())]):
+            totals[0] += views
+            totals[1] += new_visitors
+    if not hourly:
+        return
+
+    counters = ('views', 'new_visitors')
+    db.session.execute(insert_or_increment(CardViewHourly, [
+        {'card_id': card_id, 'bucket': bucket, 'views': views, 'new_visitors': new}
+        for (card_id, bucket), (views, new) in hourly.items()
+    ], counters))
+    db.session.execute(insert_or_increment(CardViewDaily, [
+        {'card_id': card_id, 'day': day, 'views': views, 'new_visitors': new}
+        for (card_id, day), (views, new) in daily.items()
+    ], counters))
+
+
+def delete_card_views(card_id):
+    """Remove raw views, rollups and sketches of a deleted card (not committed)."""
+    for model in (CardView, CardViewHourly, CardViewDaily, CardVisitorSketch, CardVisitorSketchDaily):
+        db.session.execute(delete(model).where(model.card_id == card_id))
+
+
+# ───────── Backfill & compaction ─────────
+
+def backfill_rollups():
+    """
+    Build the rollups from existing CardView rows when they are still empty.
+
+    Rows are read in chunks and bucketed with pandas. Inserts skip existing
+    keys, so a concurrent second run cannot double count.
+    """
+    if db.session.execute(select(CardViewHourly.card_id).limit(1)).first() is not None:
+        return 0
+
+    partials = []
+    query = select(CardView.card_id, CardView.viewed_at).where(CardView.viewed_at.is_not(None))
+    with db.engine.connect() as connection:
+        for chunk in pd.read_sql(query, connection, chunksize=BACKFILL_CHUNK_SIZE):
+            chunk['bucket'] = pd.to_datetime(chunk['viewed_at']).dt.floor('h')
+            partials.append(chunk.groupby(['card_id', 'bucket']).size())
+    if not partials:
+        return 0
+
+    # Each CardView row is a first visit; repeat views were never stored.
+    hourly = pd.concat(partials).groupby(level=[0, 1]).sum().rename('views').reset_index()
+    hourly['new_visitors'] = hourly['views']
+    daily = (
+        hourly.assign(day=hourly['bucket'].dt.date)
+        .groupby(['card_id', 'day'])[['views', 'new_visitors']].sum()
+        .reset_index()
+    )
+
+    for model, frame, key in ((CardViewHourly, hourly, 'bucket'), (CardViewDaily, daily, 'day')):
+        records = [
+            {
+                'card_id': int(row.card_id),
+                key: getattr(row, key).to_pydatetime() if key == 'bucket' else getattr(row, key),
+                'views': int(row.views),
+                'new_visitors': int(row.new_visitors),
+            }
+            for row in frame.itertuples(index=False)
+        ]
+        for start in range(0, len(records), 1000):
+            db.session.execute(insert_ignore(model), records[start:start + 1000])
+    db.session.commit()
+    return len(hourly)
+
+
+def compact_views(retention_days, hourly_retention_days=None, now=None):
+    """
+    Delete raw CardView rows (and optionally hourly rollups) past retention.
+
+    Their counts already live in the rollups; daily rollups are kept forever.
+    Daily visitor sketches are pruned together with the hourly rollups.
+
+    Returns:
+        tuple: (raw rows deleted, hourly rollup rows deleted)
+    """
+    now = now or datetime.utcnow()
+    deleted_views = deleted_hourly = 0
+    if retention_days and retention_days > 0:
+        result = db.session.execute(
+            delete(CardView).where(CardView.viewed_at < now - timedelta(days=retention_days))
+        )
+        deleted_views = max(result.rowcount, 0)
+    if hourly_retention_days and hourly_retention_days > 0:
+        cutoff = hour_bucket(now - timedelta(days=hourly_retention_days))
+        result = db.session.execute(delete(CardViewHourly).where(CardViewHourly.bucket < cutoff))
+        deleted_hourly = max(result.rowcount, 0)
+        db.session.execute(delete(CardVisitorSketchDaily).where(CardVisitorSketchDaily.day < cutoff.date()))
+    db.session.commit()
+    return deleted_views, deleted_hourly
+
+
+# ───────── Queries ─────────
+
+def _window(days, granularity, now):
+    if granularity == 'hour':
+        end = hour_bucket(now)
+        start = end - timedelta(hours=days * 24 - 1)
+        return start, end, pd.date_range(start, end, freq='h')
+    end = now.date()
+    start = end - timedelta(days=days - 1)
+    return start, end, pd.date_range(start, end, freq='D')
+
+
+def _series_totals(model, column, card_id, start, end):
+    return db.session.execute(
+        select(model.__table__.c[column], model.views, model.new_visitors)
+        .where(model.card_id == card_id, model.__table__.c[column] >= start, model.__table__.c[column] <= end)
+    ).all()
+
+
+def card_trend(card_id, days=30, granularity='day', now=None):
+    """
+    View trend of one card over the last ``days``.
+
+    Returns a dict with a gap-free series of {t, views, new_visitors,
+    repeat_views} (plus a moving average for daily series), the window
+    totals, and the change against the previous window of the same length.
+    Daily series of cards with visitor sketches also carry estimated
+    unique_visitors per day and over the whole window.
+    """
+    now = now or datetime.utcnow()
+    if granularity == 'hour':
+        days = max(1, min(days, MAX_HOURLY_DAYS))
+        model, column = CardViewHourly, 'bucket'
+    else:
+        days = max(1, min(days, MAX_DAYS))
+        model, column = CardViewDaily, 'day'
+
+    start, end, index = _window(days, granularity, now)
+    rows = _series_totals(model, column, card_id, start, end)
+    frame = pd.DataFrame(rows, columns=['t', 'views', 'new_visitors'])
+    frame['t'] = pd.to_datetime(frame['t'])
+    frame = frame.set_index('t').reindex(index, fill_value=0).astype('int64')
+    frame['repeat_views'] = np.maximum(frame['views'] - frame['new_visitors'], 0)
+    if granularity == 'day':
+        frame['views_avg'] = frame['views'].rolling(MOVING_AVERAGE_DAYS, min_periods=1).mean().round(2)
+
+    previous_start = start - (end - start) - (timedelta(hours=1) if granularity == 'hour' else timedelta(days=1))
+    previous = db.session.execute(
+        select(func.coalesce(func.sum(model.views), 0))
+        .where(model.card_id == card_id, model.__table__.c[column] >= previous_start,
+               model.__table__.c[column] < start)
+    ).scalar()
+
+    totals = frame[['views', 'new_visitors', 'repeat_views']].sum()
+    change = None
+    if previous:
+        change = round((int(totals['views']) - previous) * 100.0 / previous, 1)
+
+    uniques = window_uniques(card_id, start, end) if granularity == 'day' else None
+    if uniques:
+        per_day, _, _ = uniques
+        frame['unique_visitors'] = [per_day.get(day.date(), 0) for day in frame.index]
+
+    fmt = '%Y-%m-%dT%H:00' if granularity == 'hour' else '%Y-%m-%d'
+    series = frame.reset_index(names='t')
+    series['t'] = series['t'].dt.strftime(fmt)
+    result = {
+        'card_id': card_id,
+        'granularity': granularity,
+        'days': days,
+        'series': series.to_dict(orient='records'),
+        'totals': {key: int(value) for key, value in totals.items()},
+        'previous_views': int(previous),
+        'change_pct': change,
+    }
+    if uniques:
+        _, window_total, error = uniques
+        result['totals']['unique_visitors'] = window_total
+        result['unique_visitors_error'] = round(error, 4)
+    return result
+
+
+def top_cards(user_id=None, days=7, limit=10, now=None):
+    """
+    Most viewed cards over the last ``days`` (all cards, or ``user_id``'s).
+
+    The top-N aggregation runs in SQL against the daily rollup so only
+    ``limit`` rows come back, however many cards there are.
+    """
+    now = now or datetime.utcnow()
+    days = max(1, min(days, MAX_DAYS))
+    start = now.date() - timedelta(days=days - 1)
+    views = func.sum(CardViewDaily.views).label('views')
+    query = (
+        select(Card.id, Card.name, views, func.sum(CardViewDaily.new_visitors).label('new_visitors'))
+        .join(Card, Card.id == CardViewDaily.card_id)
+        .where(CardViewDaily.day >= start)
+        .group_by(Card.id, Card.name)
+        .order_by(views.desc(), Card.id)
+        .limit(limit)
+    )
+    if user_id is not None:
+        query = query.where(Card.user_id == user_id)
+    return [
+        {
+            'card_id': row.id,
+            'name': row.name,
+            'views': int(row.views or 0),
+            'new_visitors': int(row.new_visitors or 0),
+            'repeat_views': max(int(row.views or 0) - int(row.new_visitors or 0), 0),
+        }
+        for row in db.session.execute(query)
+    ]
@@ -0,0 +1,227 @@
+"""
+Write-behind view recording for public card pages.
+
+view_card used to run a CardView lookup, an insert, ``card.views += 1`` and a
+commit for every new visitor. The recorder below buffers view events in
+memory and flushes them in batches instead:
+
+- one multi-row insert-or-ignore into CardView per card per hour per flush
+- one atomic ``UPDATE card SET views = views + n`` per card per flush
+- one upsert each into the hourly and daily rollups (utils/view_analytics.py)
+
+Counts stay correct across gunicorn workers because no worker ever writes an
+absolute value into ``card.views``; every worker only adds the number of
+CardView rows it actually inserted, and the unique indexes on CardView decide
+which rows those are. Repeat views by the same visitor are not stored as
+rows, but they are counted in the rollups.
+
+With VIEW_COUNTING = "hll" new visitors are recognised by HyperLogLog
+sketches instead of CardView rows (utils/visitor_sketches.py), and writing
+the rows becomes optional.
+
+Settings (read from app.config):
+- VIEW_FLUSH_INTERVAL: seconds between background flushes (0 = write inline)
+- VIEW_FLUSH_SIZE: number of buffered events that triggers an early flush
+- VIEW_COUNTING: "exact" (CardView rows) or "hll" (sketches)
+- VIEW_LOG_ROWS: also write CardView rows in "hll" mode
+"""
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import func, update
+
+from models import db, Card, CardView
+from utils.db_utils import insert_ignore
+from utils.view_analytics import add_to_rollups, hour_bucket
+from utils.visitor_sketches import add_visitors, visitor_key
+
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_FLUSH_SIZE = 200
+
+COUNTING_MODES = ("exact", "hll")
+
+# Upper bound on events kept around after a failed flush, so a database
+# outage cannot grow the buffer without limit.
+MAX_PENDING_FACTOR = 20
+
+
+class ViewRecorder:
+    """Collect card view events and persist them in batches."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+        self.flush_size = DEFAULT_FLUSH_SIZE
+        self.counting = "exact"
+        self.log_rows = True
+
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = float(app.config.get("VIEW_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+        self.flush_size = max(1, int(app.config.get("VIEW_FLUSH_SIZE", DEFAULT_FLUSH_SIZE)))
+        self.counting = app.config.get("VIEW_COUNTING", "exact")
+        if self.counting not in COUNTING_MODES:
+            raise ValueError(f"VIEW_COUNTING must be one of {', '.join(COUNTING_MODES)}")
+        # Exact counting needs the rows; with sketches they are an optional log.
+        self.log_rows = self.counting == "exact" or bool(app.config.get("VIEW_LOG_ROWS"))
+        app.extensions["view_recorder"] = self
+        atexit.register(self.flush)
+
+    # ───────── Recording ─────────
+
+    def record(self, card_id, viewer_id=None, session_id=None):
+        """
+        Queue a view of ``card_id`` by a logged-in viewer or an anonymous session.
+
+        Duplicate events within the same buffer are collapsed here (and
+        counted as repeat views); duplicates against already-persisted rows
+        are ignored by the insert at flush time.
+        """
+        if viewer_id is not None:
+            session_id = None
+        elif not session_id:
+            return
+
+        key = (card_id, viewer_id, session_id)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [datetime.utcnow(), 1]
+            else:
+                entry[1] += 1
+            pending_count = len(self._pending)
+
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+
+        self._ensure_worker()
+        if pending_count >= self.flush_size:
+            self._wakeup.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ───────── Flushing ─────────
+
+    def flush(self):
+        """Write every buffered event to the database. Returns rows inserted."""
+        if self.app is None:
+            return 0
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._pending = OrderedDict()
+
+            with self.app.app_context():
+                try:
+                    inserted = self._write_batch(batch)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Failed to flush %d card views", len(batch))
+                    self._requeue(batch)
+                    return 0
+            return inserted
+
+    def _write_batch(self, batch):
+        groups = {}
+        for (card_id, viewer_id, session_id), (viewed_at, hits) in batch.items():
+            group = groups.setdefault((card_id, hour_bucket(viewed_at)), {"rows": [], "views": 0})
+            group["rows"].append({
+                "card_id": card_id,
+                "viewer_id": viewer_id,
+                "session_id": session_id,
+                "viewed_at": viewed_at,
+            })
+            group["views"] += hits
+
+        new_visitors = {}
+        if self.log_rows:
+            for key, group in groups.items():
+                # The unique indexes on CardView drop repeat visitors inside the
+                # insert itself; rowcount is the number of genuinely new views.
+                result = db.session.execute(insert_ignore(CardView).values(group["rows"]))
+                new_visitors[key] = max(result.rowcount, 0)
+        if self.counting == "hll":
+            # The sketches decide who is new; CardView rows are only a log.
+            new_visitors = add_visitors({
+                key: [visitor_key(row["viewer_id"], row["session_id"]) for row in group["rows"]]
+                for key, group in groups.items()
+            })
+
+        new_per_card = {}
+        rollups = []
+        for (card_id, bucket), group in groups.items():
+            count = new_visitors[(card_id, bucket)]
+            new_per_card[card_id] = new_per_card.get(card_id, 0) + count
+            rollups.append((card_id, bucket, group["views"], count))
+
+        inserted = 0
+        for card_id, count in new_per_card.items():
+            if count <= 0:
+                continue
+            db.session.execute(
+                update(Card)
+                .where(Card.id == card_id)
+                .values(views=func.coalesce(Card.views, 0) + count)
+            )
+            inserted += count
+
+        add_to_rollups(rollups)
+        db.session.commit()
+        return inserted
+
+    def _requeue(self, batch):
+        with self._lock:
+            merged = OrderedDict(batch)
+            for key, (viewed_at, hits) in self._pending.items():
+                if key in merged:
+                    merged[key][1] += hits
+                else:
+                    merged[key] = [viewed_at, hits]
+            limit = self.flush_size * MAX_PENDING_FACTOR
+            while len(merged) > limit:
+                merged.popitem(last=False)
+            self._pending = merged
+
+    # ───────── Background worker ─────────
+
+    def _ensure_worker(self):
+        # Started lazily (and restarted after a fork) so each gunicorn worker
+        # owns exactly one flusher thread.
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="view-recorder", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+view_recorder = ViewRecorder()
@@ -0,0 +1,181 @@
+"""
+Unique-visitor counting with HyperLogLog sketches (VIEW_COUNTING = "hll").
+
+In the default "exact" mode every distinct visitor leaves a CardView row,
+whose unique indexes decide who is new. In "hll" mode the view recorder
+adds visitors to two sketches per card instead:
+
+- CardVisitorSketch: every visitor the card ever had; ``card.views`` and
+  the rollups' new_visitors are derived from how much its estimate grows
+- CardVisitorSketchDaily: the visitors of one day; merging the days of a
+  window gives the unique visitors over that window (see window_uniques)
+
+Sketch rows are read with SELECT ... FOR UPDATE, merged and written back in
+the same transaction, so concurrent flushes from several gunicorn workers
+serialize on the row instead of overwriting each other. ``card.views`` is
+still only ever incremented, by the growth of the estimate under that lock,
+so it tracks the sketch's estimate itself, within its standard error of
+the true count (utils/hll.py).
+
+Raw CardView rows are optional in this mode (VIEW_LOG_ROWS).
+"""
+from sqlalchemy import select, tuple_, update
+
+from models import db, CardView, CardVisitorSketch, CardVisitorSketchDaily
+from utils.db_utils import insert_ignore
+from utils.hll import HyperLogLog
+
+
+SEED_BATCH_SIZE = 1000
+
+
+def visitor_key(viewer_id=None, session_id=None):
+    """Sketch item for a logged-in viewer or an anonymous session."""
+    if viewer_id is not None:
+        return f"u:{viewer_id}"
+    return f"s:{session_id}"
+
+
+def _lock_sketches(model, keys):
+    """Load and lock the sketches for primary ``keys``, creating empty rows first."""
+    table = model.__table__
+    key_columns = [column.name for column in table.primary_key.columns]
+    empty = HyperLogLog().to_bytes()
+    db.session.execute(insert_ignore(model), [
+        dict(zip(key_columns, key), registers=empty) for key in keys
+    ])
+
+    columns = [table.c[name] for name in key_columns]
+    if len(columns) == 1:
+        condition = columns[0].in_([key[0] for key in keys])
+    else:
+        condition = tuple_(*columns).in_(keys)
+    rows = db.session.execute(
+        select(*columns, table.c.registers).where(condition).with_for_update()
+    )
+    return {tuple(row[:-1]): HyperLogLog.from_bytes(row[-1]) for row in rows}
+
+
+def _save_sketches(model, sketches, keys):
+    key_columns = [column.name for column in model.__table__.primary_key.columns]
+    db.session.execute(update(model), [
+        dict(zip(key_columns, key), registers=sketches[key].to_bytes()) for key in keys
+    ])
+
+
+def add_visitors(groups):
+    """
+    Add visitors to their cards' lifetime and daily sketches (not committed).
+
+    Args:
+        groups: dict of (card_id, hour bucket) -> list of distinct visitor keys
+
+    Returns:
+        dict: (card_id, hour bucket) -> estimated number of new visitors
+    """
+    if not groups:
+        return {}
+    card_ids = sorted({card_id for card_id, _ in groups})
+    day_keys = sorted({(card_id, bucket.date()) for card_id, bucket in groups})
+    lifetime = _lock_sketches(CardVisitorSketch, [(card_id,) for card_id in card_ids])
+    daily = _lock_sketches(CardVisitorSketchDaily, day_keys)
+
+    estimates = {card_id: lifetime[(card_id,)].count() for card_id in card_ids}
+    changed_cards, changed_days = set(), set()
+    new_visitors = {}
+    for card_id, bucket in sorted(groups, key=lambda key: (key[1], key[0])):
+        sketch = lifetime[(card_id,)]
+        day_key = (card_id, bucket.date())
+        visitors = groups[(card_id, bucket)]
+        changed = False
+        for key in visitors:
+            changed |= sketch.add(key)
+            if daily[day_key].add(key):
+                changed_days.add(day_key)
+
+        new = 0
+        if changed:
+            changed_cards.add((card_id,))
+            estimate = sketch.count()
+            # The whole growth is counted, even when it exceeds the group: a
+            # single visitor can move the estimate by more than one, and the
+            # next flush starts from the stored sketch, so anything dropped
+            # here would never be counted. The sum of the deltas is the
+            # sketch's estimate.
+            new = max(estimate - estimates[card_id], 0)
+            estimates[card_id] = max(estimate, estimates[card_id])
+        new_visitors[(card_id, bucket)] = new
+
+    if changed_cards:
+        _save_sketches(CardVisitorSketch, lifetime, sorted(changed_cards))
+    if changed_days:
+        _save_sketches(CardVisitorSketchDaily, daily, sorted(changed_days))
+    return new_visitors
+
+
+def window_uniques(card_id, start, end):
+    """
+    Unique visitors of ``card_id`` per day and over [start, end] (dates).
+
+    Returns:
+        tuple: ({day: estimate}, window estimate, standard error), or None
+        when the card has no daily sketches in the window
+    """
+    rows = db.session.execute(
+        select(CardVisitorSketchDaily.day, CardVisitorSketchDaily.registers)
+        .where(CardVisitorSketchDaily.card_id == card_id,
+               CardVisitorSketchDaily.day >= start, CardVisitorSketchDaily.day <= end)
+    ).all()
+    if not rows:
+        return None
+    merged = HyperLogLog()
+    per_day = {}
+    for day, registers in rows:
+        sketch = HyperLogLog.from_bytes(registers)
+        per_day[day] = sketch.count()
+        merged.merge(sketch)
+    return per_day, merged.count(), merged.standard_error
+
+
+def seed_sketches():
+    """
+    Build sketches from existing CardView rows when there are none yet.
+
+    Run when switching to "hll" mode so visitors already counted in
+    ``card.views`` are not counted again; ``card.views`` itself is left as is.
+    """
+    if db.session.execute(select(CardVisitorSketch.card_id).limit(1)).first() is not None:
+        return 0
+
+    query = (
+        select(CardView.card_id, CardView.viewer_id, CardView.session_id, CardView.viewed_at)
+        .order_by(CardView.card_id)
+        .execution_options(yield_per=SEED_BATCH_SIZE)
+    )
+    lifetime_rows, daily_rows = [], []
+    current_id, lifetime, daily = None, None, {}
+
+    def finish_card():
+        lifetime_rows.append({"card_id": current_id, "registers": lifetime.to_bytes()})
+        daily_rows.extend(
+            {"card_id": current_id, "day": day, "registers": sketch.to_bytes()}
+            for day, sketch in daily.items()
+        )
+
+    for card_id, viewer_id, session_id, viewed_at in db.session.execute(query):
+        if card_id != current_id:
+            if current_id is not None:
+                finish_card()
+            current_id, lifetime, daily = card_id, HyperLogLog(), {}
+        key = visitor_key(viewer_id, session_id)
+        lifetime.add(key)
+        if viewed_at is not None:
+            daily.setdefault(viewed_at.date(), HyperLogLog()).add(key)
+    if current_id is not None:
+        finish_card()
+
+    for model, rows in ((CardVisitorSketch, lifetime_rows), (CardVisitorSketchDaily, daily_rows)):
+        for start in range(0, len(rows), SEED_BATCH_SIZE):
+            db.session.execute(insert_ignore(model), rows[start:start + SEED_BATCH_SIZE])
+    db.session.commit()
+    return len(lifetime_rows)